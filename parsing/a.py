@@ -2,17 +2,33 @@
 # -*- coding: utf-8 -*-
 
 import os
-import sys
 import re
 import time
 import json
-import glob
+import asyncio
 import argparse
-import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
+
+from fetcher import AsyncFetcher, FetchError, run
+from extract import (
+    extract_links_from_page, extract_first_script, extract_next_data,
+    card_prices, detail_summary, search_listings, search_meta,
+)
+from listing_index import ListingIndex, listing_id_from_url
+from journal import PERMANENT_STATUSES, CrawlJournal
+from pipeline import ParsePool
+from http_cache import DEFAULT_MAX_BYTES, DEFAULT_TTL, ResponseCache
+from replay import FixtureRecorder
+from telemetry import CrawlTelemetry
+from shards import DEFAULT_SHARD_SIZE, append_record, zstandard
+from partition import MAX_SLICES, MAX_SPLIT_DEPTH, MAX_STALLED_SPLITS, Slice, split_coverage
+from seen_set import DEFAULT_ERROR_RATE, SeenSet
+from work_queue import DEFAULT_LEASE, WorkQueue, worker_id
+from recrawl import category_of_url, schedule
+from transform_manifest import build_output
+from field_map import transform_property
+import columnar
 
 # Константы
 DEFAULT_HEADERS = {
@@ -35,7 +51,40 @@ DEFAULT_COOKIES = {
     "pf_performance": "1",
 }
 
-BASE_SEARCH_URL = "https://www.propertyfinder.ae/en/search?l=1&c=2&t=1&fu=0&rp=y&ob=nd"
+# Поисковые категории: c=2 — аренда, c=1 — продажа
+SEARCH_CATEGORIES = {
+    "rent": "https://www.propertyfinder.ae/en/search?l=1&c=2&t=1&fu=0&rp=y&ob=nd",
+    "sale": "https://www.propertyfinder.ae/en/search?l=1&c=1&t=1&fu=0&rp=y&ob=nd",
+}
+
+BASE_SEARCH_URL = SEARCH_CATEGORIES["rent"]
+# Записи карточек поиска (--cards-only), уже в формате transform_property
+CARDS_FILE = "cards.ndjson"
+# Форматы итогового файла properties.<формат> (transform_pool.RecordWriter)
+OUTPUT_FORMATS = ("json", "ndjson", "ndjson.gz", "ndjson.zst")
+
+def rebase_url(url, base_url):
+    """Point ``url`` at another origin, e.g. a local stand-in server."""
+    base = urlparse(base_url)
+    return urlparse(url)._replace(scheme=base.scheme, netloc=base.netloc).geturl()
+
+def category_dir(output_dir, category):
+    """Per-category output directory.
+
+    The "<category>_listings" name keeps import_properties able to infer
+    rent vs sell from the path ("/rent_", "/sale_").
+    """
+    return os.path.join(output_dir, f"{category}_listings")
+
+def interleave(*iterables):
+    """Round-robin items from several iterables: a1, b1, a2, b2, ..."""
+    iterators = [iter(it) for it in iterables]
+    while iterators:
+        for it in list(iterators):
+            try:
+                yield next(it)
+            except StopIteration:
+                iterators.remove(it)
 
 def build_page_url(base_url, page_num):
     """Build URL for specific page number."""
@@ -44,264 +93,1178 @@ def build_page_url(base_url, page_num):
     sep = "&" if "?" in base_url else "?"
     return f"{base_url}{sep}page={page_num}"
 
-def extract_links_from_page(html):
-    """Extract property links from search page HTML."""
-    soup = BeautifulSoup(html, "lxml")
-    section = soup.select_one("[aria-label='Properties']")
-    if not section:
-        return []
-    return [
-        a["href"]
-        for a in section.select("[data-testid='property-card-link']")
-        if a.has_attr("href")
-    ]
-
-def extract_first_script(html):
-    """Extract JSON data from first script tag."""
-    soup = BeautifulSoup(html, "lxml")
-    script = soup.body.find("script")
-    text = script.string or ""
-    idx = text.find("{")
-    return text[idx:] if idx >= 0 else ""
-
 def get_file_name_from_url(url, ext=".json"):
     """Generate filename from URL."""
     base = os.path.basename(urlparse(url).path) or f"page_{int(time.time())}"
     name = re.sub(r"\W+", "_", base)
     return f"{name}{ext}"
 
-def process_page(session, url, page_num, retries=3):
-    """Process a single search page and return property links."""
-    for attempt in range(retries):
-        try:
-            r = session.get(url, timeout=30)
-            r.raise_for_status()
-            links = extract_links_from_page(r.text)
-            print(f"[Page {page_num}] Found {len(links)} links")
-            return links
-        except Exception as e:
-            if attempt == retries - 1:
-                print(f"[Page {page_num}] Error after {retries} attempts: {e}")
-                return []
-            time.sleep(2 ** attempt)  # exponential backoff
-
-def process_property(session, link, json_dir, idx, total):
-    """Process a single property page and save JSON data."""
+def parse_search_page(body, want_prices=False, want_meta=False, want_cards=False):
+    """Extract (links, card prices, pagination meta, card records, seconds spent) from a search page.
+
+    Runs in a ParsePool worker; prices / meta / cards are None unless
+    requested.  Card records are the cards' property objects passed through
+    transform_property, i.e. the same schema as a fetched property page.
+    """
+    start = time.perf_counter()
+    links = extract_links_from_page(body)
+    prices = meta = cards = None
+    if want_prices or want_meta or want_cards:
+        data = extract_next_data(body)
+        prices = card_prices(data) if want_prices else None
+        meta = search_meta(data) if want_meta else None
+        if want_cards:
+            cards = [record for record in map(transform_property, search_listings(data))
+                     if record and record.get("id") is not None]
+    return links, prices, meta, cards, time.perf_counter() - start
+
+async def process_page(fetcher, url, page_num, retries=3, prices=None, meta=None, pool=None,
+                       cards=None):
+    """Process a single search page and return property links.
+
+    Returns [] for a page that does not exist (4xx other than 429) and None
+    on any other failure.  If ``prices`` / ``meta`` are dicts, they are
+    updated with the card prices / pagination info of the page; if
+    ``cards`` is a list, it is extended with the page's card records.
+    Transient HTTP errors are retried by the fetcher; parsing runs in ``pool``.
+    """
+    pool = pool or ParsePool(workers=0)
+    try:
+        async with pool.slot():
+            r = await fetcher.get(url, retries=retries)
+            links, page_prices, page_meta, page_cards, parse_time = await pool.run(
+                parse_search_page, r.body, prices is not None, meta is not None, cards is not None
+            )
+        fetcher.telemetry.observe("parse", parse_time)
+        if prices is not None:
+            prices.update(page_prices)
+        if meta is not None:
+            meta.update(page_meta)
+        if cards is not None:
+            cards.extend(page_cards)
+        print(f"[Page {page_num}] Found {len(links)} links")
+        return links
+    except FetchError as e:
+        if 400 <= e.status < 500 and e.status != 429:
+            print(f"[Page {page_num}] {e}: no such page")
+            return []
+        print(f"[Page {page_num}] Error after {retries + 1} attempts: {e}")
+        return None
+    except Exception as e:
+        print(f"[Page {page_num}] Error after {retries + 1} attempts: {e}")
+        return None
+
+def property_summary(script):
+    """detail_summary of a property page's JSON text, or None if it does not parse."""
     try:
-        r = session.get(link, timeout=30)
-        r.raise_for_status()
-        script = extract_first_script(r.text)
-        if script:
-            fname = get_file_name_from_url(link, ext=".json")
-            path = os.path.join(json_dir, fname)
-            with open(path, "w", encoding="utf-8") as outf:
-                outf.write(script)
+        return detail_summary(json.loads(script))
+    except ValueError:
+        return None
+
+def save_property_json(html, link, json_dir, want_summary=False):
+    """Extract the embedded JSON of a property page and write it to json_dir.
+
+    Returns (parse seconds, write seconds, summary), or None if the page has
+    no JSON; summary is the page's property_summary if ``want_summary``.
+    """
+    start = time.perf_counter()
+    script = extract_first_script(html)
+    if not script:
+        return None
+    summary = property_summary(script) if want_summary else None
+    parsed = time.perf_counter()
+    fname = get_file_name_from_url(link, ext=".json")
+    path = os.path.join(json_dir, fname)
+    with open(path, "w", encoding="utf-8") as outf:
+        outf.write(script)
+    return parsed - start, time.perf_counter() - parsed, summary
+
+def save_property_shard(html, link, json_dir, compression="gzip", max_bytes=DEFAULT_SHARD_SIZE,
+                        want_summary=False):
+    """Extract the embedded JSON of a property page and append it to a shard in json_dir.
+
+    Returns (parse seconds, write seconds, summary), or None if the page has no JSON.
+    """
+    start = time.perf_counter()
+    script = extract_first_script(html)
+    if not script:
+        return None
+    summary = property_summary(script) if want_summary else None
+    parsed = time.perf_counter()
+    listing_id = listing_id_from_url(link) or get_file_name_from_url(link, ext="")
+    append_record(json_dir, listing_id, script, compression, max_bytes)
+    return parsed - start, time.perf_counter() - parsed, summary
+
+async def process_property(fetcher, link, json_dir, idx, total, pool=None, shards=None,
+                           summaries=None):
+    """Process a single property page and save JSON data.
+
+    Returns None on success, otherwise (cause, HTTP status or None).
+    Only the download happens here; extraction and writing run in ``pool``.
+    ``shards`` = (compression, max_bytes) appends to NDJSON shards instead
+    of writing one file per property.  If ``summaries`` is a dict, it maps
+    ``link`` to the page's price and listing date (see detail_summary).
+    """
+    pool = pool or ParsePool(workers=0)
+    status = None
+    try:
+        async with pool.slot():
+            r = await fetcher.get(link)
+            want_summary = summaries is not None
+            if shards:
+                timing = await pool.run(save_property_shard, r.body, link, json_dir, *shards,
+                                        want_summary)
+            else:
+                timing = await pool.run(save_property_json, r.body, link, json_dir, want_summary)
+        if timing:
+            fetcher.telemetry.observe("parse", timing[0])
+            fetcher.telemetry.observe("write", timing[1])
+            if want_summary and timing[2] is not None:
+                summaries[link] = timing[2]
             print(f"[Property {idx}/{total}] Saved: {link}")
+            return None
+        cause = "no JSON data in page"
+    except FetchError as e:
+        status = e.status
+        cause = f"HTTP {e.status}"
     except Exception as e:
-        print(f"[Property {idx}/{total}] Error processing {link}: {e}")
-
-def transform_property(data):
-    """Transform raw property data into standardized format."""
-    prop = data  # now the JSON is at the root
-
-    # Extract fields
-    property_id = prop.get("id")
-    url = prop.get("share_url")
-    title = prop.get("title")
-    display_address = prop.get("location", {}).get("full_name")
-    bedrooms = prop.get("bedrooms")
-    bathrooms = prop.get("bathrooms")
-    added_on = prop.get("listed_date")
-    broker_name = prop.get("broker", {}).get("name")
-    agent_name = prop.get("agent", {}).get("name")
-    agent_info = prop.get("agent", {})
-
-    # phone
-    agent_phone = None
-    for c in prop.get("contact_options", []):
-        if c.get("type") == "phone":
-            agent_phone = c.get("value")
-            break
-
-    verified = prop.get("is_verified")
-    reference = prop.get("reference")
-    broker_license = prop.get("broker", {}).get("license_number")
-    broker_info = prop.get("broker", {})
-    price_duration = "rent" if prop.get("isRent") else "sell"
-    property_type = prop.get("property_type")
-    price = prop.get("price", {}).get("value")
-    rera_obj = prop.get("rera", {}) or {}
-    rera_number = rera_obj.get("number")
-    price_currency = prop.get("price", {}).get("currency")
-
-    coord = prop.get("location", {}).get("coordinates", {}) or {}
-    coordinates = {
-        "latitude": coord.get("lat"),
-        "longitude": coord.get("lon"),
+        cause = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+    print(f"[Property {idx}/{total}] Error processing {link}: {cause}")
+    return cause, status
+
+def select_changed_links(links, prices, index):
+    """Split links into (to_fetch, unchanged) using the listing index.
+
+    A link is fetched if its listing is new, has no card price, or its card
+    price differs from the indexed one.
+    """
+    to_fetch, unchanged = [], []
+    for link in links:
+        pid = listing_id_from_url(link)
+        if pid is None or index.is_changed(pid, prices.get(pid)):
+            to_fetch.append(link)
+        else:
+            unchanged.append(link)
+    return to_fetch, unchanged
+
+def process_directory(input_dir, output_file, ext=".json", cards_file=None, workers=1):
+    """Process all JSON files (and NDJSON shards) in directory and save transformed data.
+
+    The output is a JSON array, or NDJSON if ``output_file`` ends with
+    .ndjson / .ndjson.gz / .ndjson.zst.  Files are read in sorted path
+    order and the first record of an id wins; ``workers`` > 1 transforms
+    them in a process pool (transform_pool.py) with the same result.
+    Records of ``cards_file`` (--cards-only) are added after them for the
+    listings that have no property page.  A rerun (--resume, --retry-failed)
+    only transforms the files that are new or changed since the last one
+    (transform_manifest.py).
+    """
+    def on_error(path, kind, error):
+        if kind == "record":
+            print(f"Error processing a record of {path}: {error}")
+        elif kind == "shard":
+            print(f"Error reading shard {path}: {error}")
+        else:
+            print(f"Error processing {path}: {error}")
+
+    stats = build_output(input_dir, output_file, transform_property, ext, workers,
+                         extra_files=[cards_file] if cards_file else (), on_error=on_error)
+    print(f"Processing complete ({stats['mode']}: {stats['transformed']} of {stats['files']} files "
+          f"transformed, {stats['records']} records). Output written to {output_file}")
+
+def export_parquet(output_dir, dataset_dir):
+    """Add the transformed output of a run to a Parquet dataset (columnar.py)."""
+    counts = columnar.export_snapshot(output_dir, dataset_dir)
+    rows = ", ".join(f"{duration} {n}" for duration, n in sorted(counts.items())) or "no rows"
+    print(f"Parquet: {rows} rows -> {dataset_dir}")
+
+async def crawl_search_pages(fetcher, args, categories, on_links, journal=None,
+                             want_prices=False, pool=None, want_cards=False):
+    """Fetch the search pages of all categories.
+
+    Links are handed on as soon as a page yields them: ``await
+    on_links(category, links, prices, cards)`` is called once per page
+    (prices / cards are the page's card prices / card records, or None
+    unless ``want_prices`` / ``want_cards``).  Links of pages journaled by
+    an interrupted run are handed on first, without cards.
+
+    The first pending page of each category is fetched first to learn the
+    real page count, so pages past the end are never requested.  If the
+    count is unknown, a category stops once --max-empty-pages consecutive
+    pages come back empty or 4xx: its queued page requests are cancelled.
+    """
+    done_pages = {category: set() for category in categories}
+    if journal is not None:
+        for category in categories:
+            done_pages[category] = journal.done_pages(category)
+    pending = {
+        category: [n for n in range(args.start_page, args.end_page + 1)
+                   if n not in done_pages[category]]
+        for category in categories
     }
 
-    offering_type = prop.get("offering_type")
-    size_val = prop.get("size", {}).get("value")
-    size_unit = prop.get("size", {}).get("unit")
-    size_min = f"{size_val} {size_unit}" if size_val and size_unit else None
-
-    furnishing = prop.get("furnished", "NO").upper()
-
-    features = [
-        a.get("name")
-        for a in prop.get("amenities", [])
-        if a.get("name")
-    ]
-
-    description = prop.get("description")
-    description_html = prop.get("descriptionHTML") or description
-
-    images = [
-        img.get("full")
-        for img in prop.get("images", {}).get("property", [])
-        if img.get("full")
-    ]
-
-    similar_transactions = prop.get("similar_price_transactions")
-    rera_permit_url = rera_obj.get("permit_validation_url")
-
-    return {
-        "id": property_id,
-        "url": url,
-        "title": title,
-        "displayAddress": display_address,
-        "bedrooms": bedrooms,
-        "bathrooms": bathrooms,
-        "addedOn": added_on,
-        "broker": broker_name,
-        "agent": agent_name,
-        "agentInfo": agent_info,
-        "agentPhone": agent_phone,
-        "verified": verified,
-        "reference": reference,
-        "brokerLicenseNumber": broker_license,
-        "brokerInfo": broker_info,
-        "priceDuration": price_duration,
-        "propertyType": property_type,
-        "price": price,
-        "rera": rera_number,
-        "priceCurrency": price_currency,
-        "coordinates": coordinates,
-        "type": offering_type,
-        "sizeMin": size_min,
-        "furnishing": furnishing,
-        "features": features,
-        "description": description,
-        "descriptionHTML": description_html,
-        "images": images,
-        "similarTransactions": similar_transactions,
-        "reraPermitUrl": rera_permit_url,
+    print(f"Starting to scrape pages {args.start_page}-{args.end_page} x {len(categories)} categories "
+          f"(up to {args.concurrency} concurrent requests)...")
+    resumed = sum(len(pages) for pages in done_pages.values())
+    if resumed:
+        print(f"Resume: {resumed} search pages already done")
+        for category in categories:
+            batch, batch_prices = [], {}
+            for url, pid, price in journal.iter_links(category):
+                batch.append(url)
+                if pid is not None and price is not None:
+                    batch_prices[pid] = price
+                if len(batch) >= 500:
+                    await on_links(category, batch, batch_prices if want_prices else None, None)
+                    batch, batch_prices = [], {}
+            if batch:
+                await on_links(category, batch, batch_prices if want_prices else None, None)
+
+    async def fetch_page(category, page_num, meta=None):
+        url = build_page_url(SEARCH_CATEGORIES[category], page_num)
+        page_prices = {} if want_prices else None
+        page_cards = [] if want_cards else None
+        links = await process_page(fetcher, url, f"{category} {page_num}",
+                                   prices=page_prices, meta=meta, pool=pool, cards=page_cards)
+        if links is not None:
+            fetcher.telemetry.count("search_pages")
+            if journal is not None:
+                journal.page_done(category, page_num, links, page_prices, listing_id_from_url)
+            if links:
+                await on_links(category, links, page_prices, page_cards)
+        return category, page_num, links
+
+    # Probe: the first pending page of each category gives the real page count
+    last_page = {category: args.end_page for category in categories}
+    probes = {}
+    for category in categories:
+        page_count = journal.get_meta(f"page_count:{category}") if journal is not None else None
+        if page_count:
+            last_page[category] = min(args.end_page, page_count)
+        elif pending[category]:
+            probes[category] = {}
+    await asyncio.gather(*(
+        fetch_page(category, pending[category].pop(0), meta) for category, meta in probes.items()
+    ))
+    for category, meta in probes.items():
+        if meta.get("page_count"):
+            last_page[category] = min(args.end_page, meta["page_count"])
+            if journal is not None:
+                journal.set_meta(f"page_count:{category}", meta["page_count"])
+            print(f"[{category}] {meta.get('total_count')} listings on {meta['page_count']} pages")
+
+    # Remaining pages of all categories, interleaved into one frontier
+    frontier = interleave(*(
+        [(category, n) for n in pending[category] if n <= last_page[category]]
+        for category in categories
+    ))
+    tasks = {}
+    for category, page_num in frontier:
+        tasks[asyncio.ensure_future(fetch_page(category, page_num))] = (category, page_num)
+
+    empty = {category: set() for category in categories}
+    waiting = set(tasks)
+    while waiting:
+        done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.cancelled():
+                continue
+            category, page_num, links = task.result()
+            if links != []:
+                continue
+            # Empty or 4xx page: stop the category after N consecutive ones
+            empty[category].add(page_num)
+            lo = hi = page_num
+            while lo - 1 in empty[category]:
+                lo -= 1
+            while hi + 1 in empty[category]:
+                hi += 1
+            if hi - lo + 1 >= args.max_empty_pages and last_page[category] > hi:
+                last_page[category] = hi
+                if journal is not None:
+                    journal.set_meta(f"page_count:{category}", lo - 1)
+                cancelled = 0
+                for t in waiting:
+                    c, n = tasks[t]
+                    if c == category and n > hi and t.cancel():
+                        cancelled += 1
+                print(f"[{category}] {hi - lo + 1} empty pages in a row ({lo}-{hi}): "
+                      f"stopping, {cancelled} queued pages cancelled")
+
+async def crawl_partitions(fetcher, args, categories, on_links, want_prices=False, pool=None,
+                           want_cards=False):
+    """Enumerate each category through search slices that fit the page cap.
+
+    Page 1 of a slice gives its page count; a slice with more than
+    --page-cap pages is split (see partition.Slice.splits) and its children
+    are probed, all concurrently.  A split whose children's totals show
+    that the site ignored the filter, or that listings fell out of it (no
+    bedroom count), is replaced by the next candidate split; past
+    MAX_SPLIT_DEPTH levels or MAX_SLICES probed slices a slice is not split.
+    Once a slice fits, its remaining pages are fetched at once, so slices
+    are crawled while others are still being planned.  Links are handed on
+    like in crawl_search_pages.
+
+    Returns per-category coverage figures: the category's total listing
+    count, the summed totals of the leaf slices, listings left unreachable
+    in slices that could not be split further, listings that fell out of
+    every candidate split ("missing"), and the number of links the leaf
+    slices yielded (duplicates across slices included).
+    """
+    page_cap = args.page_cap or args.end_page
+    report = {
+        category: {"total": None, "slices": 0, "slice_total": 0, "pages": 0,
+                   "unreachable": 0, "missing": 0, "probed": 0, "yielded": 0}
+        for category in categories
     }
 
-def process_directory(input_dir, output_file, ext=".json"):
-    """Process all JSON files in directory and save transformed data."""
-    seen = set()
-    first = True
-    with open(output_file, "w", encoding="utf-8") as fout:
-        fout.write("[\n")
-        for dirpath, _, files in os.walk(input_dir):
-            for fn in files:
-                if not fn.lower().endswith(ext):
-                    continue
-                path = os.path.join(dirpath, fn)
+    async def fetch_page(slice_, page_num, meta=None):
+        url = build_page_url(slice_.url(SEARCH_CATEGORIES[slice_.category]), page_num)
+        page_prices = {} if want_prices else None
+        page_cards = [] if want_cards else None
+        links = await process_page(fetcher, url, f"{slice_} p{page_num}",
+                                   prices=page_prices, meta=meta, pool=pool, cards=page_cards)
+        if links is not None:
+            fetcher.telemetry.count("search_pages")
+            report[slice_.category]["pages"] += 1
+            if links:
+                await on_links(slice_.category, links, page_prices, page_cards)
+        return links or []
+
+    async def probe(slice_):
+        meta = {}
+        links = await fetch_page(slice_, 1, meta)
+        return slice_, links, meta.get("page_count"), meta.get("total_count")
+
+    async def choose_split(slice_, total, by_bedrooms):
+        """(probed children, whether bedrooms may still be split, reason if none)."""
+        stats = report[slice_.category]
+        fallback = None
+        reason = "cannot be split further"
+        for children in slice_.splits(by_bedrooms):
+            if stats["probed"] + len(children) > MAX_SLICES:
+                return None, by_bedrooms, f"slice limit ({MAX_SLICES}) reached"
+            stats["probed"] += len(children)
+            probes = await asyncio.gather(*(probe(child) for child in children))
+            coverage = split_coverage(total, [p[3] for p in probes])
+            if coverage == "ok":
+                return probes, by_bedrooms, None
+            if coverage == "short":
+                missing = total - sum(p[3] for p in probes)
+                print(f"[{slice_}] split by {_split_kind(children)} misses {missing} of "
+                      f"{total} listings, trying the next one")
+                if fallback is None or missing < fallback[2]:
+                    fallback = (probes, by_bedrooms, missing)
+            else:
+                reason = f"search filter of the {_split_kind(children)} split is ignored"
+                print(f"[{slice_}] {reason}")
+            # Отвергнутое деление по спальням не пробуется и в дочерних срезах
+            if _split_kind(children) == "bedrooms":
+                by_bedrooms = False
+        if fallback is not None:
+            probes, by_bedrooms, missing = fallback
+            stats["missing"] += missing
+            return probes, by_bedrooms, None
+        return None, by_bedrooms, reason
+
+    async def explore(probed, depth=0, by_bedrooms=True):
+        slice_, links, page_count, total = probed
+        stats = report[slice_.category]
+        if depth == 0:
+            stats["total"] = total
+        if page_count and page_count > page_cap:
+            if depth >= MAX_SPLIT_DEPTH:
+                probes, reason = None, f"split depth limit ({MAX_SPLIT_DEPTH}) reached"
+            else:
+                probes, by_bedrooms, reason = await choose_split(slice_, total, by_bedrooms)
+            if probes:
+                print(f"[{slice_}] {total} listings on {page_count} pages: "
+                      f"splitting into {len(probes)} slices")
+                await asyncio.gather(*(explore(p, depth + 1, by_bedrooms) for p in probes))
+                return
+            stats["unreachable"] += max(0, (total or 0) - page_cap * len(links))
+            print(f"[{slice_}] {page_count} pages, {reason}: crawling the first {page_cap}")
+        stats["slices"] += 1
+        stats["slice_total"] += total or 0
+        stats["yielded"] += len(links)
+        if page_count:
+            pages = await asyncio.gather(*(
+                fetch_page(slice_, n) for n in range(2, min(page_count, page_cap) + 1)
+            ))
+            stats["yielded"] += sum(len(page) for page in pages)
+        else:
+            # Unknown page count: walk pages until the first empty one
+            for n in range(2, page_cap + 1):
+                page = await fetch_page(slice_, n)
+                if not page:
+                    break
+                stats["yielded"] += len(page)
+
+    print(f"Partitioned crawl of {len(categories)} categories, up to {page_cap} pages per slice "
+          f"(up to {args.concurrency} concurrent requests)...")
+    roots = await asyncio.gather(*(probe(Slice(category)) for category in categories))
+    await asyncio.gather(*(explore(root) for root in roots))
+    return report
+
+def _split_kind(children):
+    """Which filter a split of partition.Slice.splits narrows: bedrooms, price or area."""
+    first, second = children[0], children[-1]
+    if first.bedrooms != second.bedrooms:
+        return "bedrooms"
+    return "price" if first.price != second.price else "area"
+
+async def crawl(args, output_dir, categories, index=None, journal=None, cache=None,
+                recorder=None, retry_only=False, known=None):
+    """Fetch search pages and property pages of all categories as one stream.
+
+    Property requests start as soon as a search page yields links: new links
+    (deduplicated by listing id as they arrive, in a disk-backed SeenSet so
+    memory stays flat) go through a bounded queue of
+    --link-queue entries to --concurrency property workers.  When the queue
+    is full, search pages wait, so memory does not grow with the number of
+    links.  Categories share one connection pool, and each category writes to
+    its own directory (see category_dir).
+
+    With a ListingIndex (--incremental) only new listings and listings whose
+    search card price changed are fetched; the index is updated as they are
+    saved.  With --recrawl N no search pages are fetched: the N listings of
+    the index most likely to have changed (recrawl.schedule) are refetched.
+
+    With a persisted SeenSet ``known`` (--skip-seen) listings saved by
+    earlier runs, of any category, are skipped; saved ones are added.
+    With --cards-only every listing is recorded from its search card and
+    property pages are fetched only for listings not in ``known``.
+
+    With a CrawlJournal every finished page is recorded as it completes, and
+    pages already recorded (by an interrupted run) are not fetched again.
+    With --partition the search pages are enumerated through slices that
+    fit the page cap (crawl_partitions) and the coverage is reported;
+    these pages are not journaled, a resumed run plans the slices again.
+    Property pages that fail are quarantined in the journal and retried at
+    the end of the run (--retry-rounds, with backoff); ``retry_only``
+    (--retry-failed) fetches only the quarantined pages of an earlier run
+    that did not answer 404/410.
+
+    Network coroutines only download; extraction and JSON writing run in a
+    ParsePool of --parse-workers processes.
+
+    With a ResponseCache (--cache-dir) responses are served from or
+    revalidated against the on-disk cache; with a FixtureRecorder (--record)
+    every response is saved as a fixture for standin_server.py.
+
+    Run telemetry (requests by status, retries, bytes, fetch / parse / write
+    histograms) is written to <output_dir>/telemetry.json and, with
+    --metrics-file, in the Prometheus text format.
+    """
+    pool = ParsePool(
+        workers=args.parse_workers,
+        queue_size=args.concurrency + (args.parse_queue or 2 * max(args.parse_workers or 0, 1)),
+    )
+    shards = None
+    if args.storage == "shards":
+        shards = (args.shard_compression, args.shard_size * 1024 * 1024)
+
+    queue = asyncio.Queue(maxsize=args.link_queue or 2 * args.concurrency)
+    seen = {category: SeenSet() for category in categories}
+    links_files = {
+        category: open(os.path.join(category_dir(output_dir, category), "links.txt"),
+                       "a" if retry_only else "w", encoding="utf-8")
+        for category in categories
+    }
+    cards_files = {}
+    if args.cards_only:
+        cards_files = {
+            category: open(os.path.join(category_dir(output_dir, category), CARDS_FILE),
+                           "a", encoding="utf-8")
+            for category in categories
+        }
+    stats = {"links": 0, "queued": 0, "started": 0, "saved": 0, "unchanged": 0, "resumed": 0,
+             "indexed": 0, "failed": 0, "recovered": 0, "known": 0, "cards": 0, "removed": 0}
+    failed = {}
+    coverage = None
+    index_rows = []
+    telemetry = CrawlTelemetry()
+    telemetry.info.update({
+        "output_dir": output_dir,
+        "categories": list(categories),
+        "pages": [args.start_page, args.end_page],
+        "concurrency": args.concurrency,
+        "parse_workers": args.parse_workers,
+        "incremental": index is not None,
+        "storage": args.storage,
+        "partition": args.partition,
+    })
+
+    def flush_index(force=False):
+        if index is not None and index_rows and (force or len(index_rows) >= 500):
+            index.record(index_rows)
+            stats["indexed"] += len(index_rows)
+            index_rows.clear()
+
+    async def on_links(category, links, prices, cards=None):
+        """Dedup the links of a page and queue the ones that need fetching.
+
+        With --cards-only the card record of every new link is written to
+        cards.ndjson.
+        """
+        fresh = []
+        cards = {str(record["id"]): record for record in cards or ()}
+        for link in links:
+            key = listing_id_from_url(link) or link
+            if not seen[category].add(key):
+                continue
+            links_files[category].write(link + "\n")
+            stats["links"] += 1
+            card = cards.get(key)
+            if card is not None and category in cards_files:
+                card["priceDuration"] = "rent" if category == "rent" else "sell"
+                cards_files[category].write(json.dumps(card, ensure_ascii=False) + "\n")
+                stats["cards"] += 1
+            if known is not None and key in known:
+                stats["known"] += 1
+                continue
+            fresh.append(link)
+        prices = prices or {}
+        if index is not None:
+            fresh, unchanged = select_changed_links(fresh, prices, index)
+            if unchanged:
+                index.touch(listing_id_from_url(link) for link in unchanged)
+                stats["unchanged"] += len(unchanged)
+        for link in fresh:
+            pid = listing_id_from_url(link)
+            if journal is not None and journal.is_detail_done(link):
+                stats["resumed"] += 1
+                if pid is not None:
+                    index_rows.append((pid, prices.get(pid), link))
+                continue
+            stats["queued"] += 1
+            await queue.put((category, link, pid, prices.get(pid)))
+        flush_index()
+
+    async def requeue_failed(rows):
+        for category, link, pid, price, cause, status, attempts in rows:
+            if category in links_files:
+                stats["queued"] += 1
+                await queue.put((category, link, pid, price))
+
+    async with AsyncFetcher(
+        DEFAULT_HEADERS, DEFAULT_COOKIES,
+        concurrency=args.concurrency, per_host=args.per_host,
+        start_concurrency=args.start_concurrency, retries=args.retries,
+        cache=cache, recorder=recorder, telemetry=telemetry,
+    ) as fetcher, pool:
+
+        async def property_worker():
+            while True:
+                category, link, pid, price = await queue.get()
+                json_dir = os.path.join(category_dir(output_dir, category), "json_data")
                 try:
-                    with open(path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                    obj = transform_property(data)
-                    if obj is None:
-                        continue
-                    oid = obj.get("id")
-                    if oid and oid in seen:
+                    stats["started"] += 1
+                    summaries = {} if index is not None else None
+                    error = await process_property(fetcher, link, json_dir, stats["started"],
+                                                   stats["queued"], pool=pool, shards=shards,
+                                                   summaries=summaries)
+                    if error is not None:
+                        cause, status = error
+                        if args.recrawl and status in PERMANENT_STATUSES and pid is not None:
+                            # Снятое объявление больше не планируется
+                            index.remove([pid])
+                            stats["removed"] += 1
+                            continue
+                        if link not in failed:
+                            stats["failed"] += 1
+                        failed[link] = (category, link, pid, price, cause, status, None)
+                        if journal is not None:
+                            journal.detail_failed(category, link, cause, status, pid, price)
                         continue
-                    if oid:
-                        seen.add(oid)
-                    if not first:
-                        fout.write(",\n")
-                    fout.write(json.dumps(obj, ensure_ascii=False, indent=2))
-                    first = False
-                except Exception as e:
-                    print(f"Error processing {path}: {e}")
-        fout.write("\n]\n")
-    print(f"Processing complete. Output written to {output_file}")
-
-def main():
+                    stats["saved"] += 1
+                    if failed.pop(link, None) is not None or retry_only:
+                        stats["recovered"] += 1
+                    if journal is not None:
+                        journal.detail_done(link)
+                    if known is not None:
+                        known.add(pid or link)
+                    if pid is not None and index is not None:
+                        summary = summaries.get(link) or {}
+                        if price is None:
+                            price = summary.get("price")
+                        index_rows.append((pid, price, link, None, summary.get("listed_date")))
+                        flush_index()
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.ensure_future(property_worker()) for _ in range(args.concurrency)]
+        try:
+            if retry_only:
+                # 404/410 не повторяются: объявление снято, страница уже не появится
+                quarantined = journal.failed_details(retryable_only=True)
+                print(f"Retrying {len(quarantined)} quarantined properties")
+                await requeue_failed(quarantined)
+            elif args.recrawl:
+                plan = schedule(index, args.recrawl, categories)
+                if plan:
+                    print(f"Recrawl: {len(plan)} listings scheduled, priority "
+                          f"{plan[0][0]:.3f}..{plan[-1][0]:.3f}")
+                    telemetry.info["recrawl"] = {"scheduled": len(plan),
+                                                 "priority": [plan[-1][0], plan[0][0]]}
+                for priority, pid, link in plan:
+                    category = category_of_url(link)
+                    links_files[category].write(link + "\n")
+                    stats["links"] += 1
+                    stats["queued"] += 1
+                    await queue.put((category, link, pid, None))
+            elif args.partition:
+                coverage = await crawl_partitions(fetcher, args, categories, on_links,
+                                                  want_prices=index is not None, pool=pool,
+                                                  want_cards=args.cards_only)
+                for category, c in coverage.items():
+                    c["unique"] = len(seen[category])
+                telemetry.info["partition"] = coverage
+            else:
+                await crawl_search_pages(fetcher, args, categories, on_links, journal,
+                                         want_prices=index is not None, pool=pool,
+                                         want_cards=args.cards_only)
+            await queue.join()
+
+            # Retry failed property pages with backoff; 404/410 are not retried
+            for round_num in range(1, args.retry_rounds + 1):
+                retry = [row for row in failed.values() if row[5] not in PERMANENT_STATUSES]
+                if not retry:
+                    break
+                delay = args.retry_backoff * 2 ** (round_num - 1)
+                print(f"Retry round {round_num}: {len(retry)} failed properties in {delay:g}s")
+                await asyncio.sleep(delay)
+                await requeue_failed(retry)
+                await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            for category, lf in links_files.items():
+                lf.close()
+                seen[category].close()
+            for cf in cards_files.values():
+                cf.close()
+            flush_index(force=True)
+            for kind in ("links", "queued", "saved", "unchanged", "resumed", "failed", "recovered",
+                         "known", "cards", "removed"):
+                telemetry.count(kind, stats[kind])
+            telemetry.info["concurrency_limit"] = int(fetcher.limiter.limit)
+            telemetry.info["concurrency_peak"] = int(fetcher.limiter.peak)
+            telemetry.finish()
+            telemetry.write_json(os.path.join(output_dir, "telemetry.json"))
+            if args.metrics_file:
+                telemetry.write_prometheus(args.metrics_file)
+
+        print(f"Found {stats['links']} links, saved {stats['saved']} of "
+              f"{stats['queued']} queued properties")
+        for category, c in (coverage or {}).items():
+            total = c["total"] or 0
+            coverage_pct = f"{100 * c['unique'] / total:.1f}%" if total else "n/a"
+            overlap = c["yielded"] - c["unique"]
+            overlap_pct = f"{100 * overlap / c['yielded']:.1f}%" if c["yielded"] else "n/a"
+            print(f"[{category}] partition: {c['slices']} slices, {c['pages']} search pages; "
+                  f"{c['unique']} unique of {c['total']} listings ({coverage_pct} coverage), "
+                  f"slice totals {c['slice_total']}, {overlap} duplicate links "
+                  f"({overlap_pct} overlap), {c['unreachable']} unreachable, "
+                  f"{c['missing']} missing from slices (no bedroom count or price)")
+        if stats["resumed"]:
+            print(f"Resume: {stats['resumed']} properties already saved")
+        if stats["failed"] or stats["recovered"]:
+            print(f"Failed properties: {stats['failed']} failed, {stats['recovered']} recovered, "
+                  f"{len(failed)} left in quarantine")
+            if failed:
+                print(f"Retry them later with: --retry-failed {output_dir}")
+        if args.cards_only:
+            print(f"Cards only: {stats['cards']} card records, details fetched for "
+                  f"{stats['queued']} new listings")
+        if known is not None:
+            print(f"Seen set: {stats['known']} listings saved by earlier runs not fetched, "
+                  f"{len(known)} known")
+        if stats["removed"]:
+            print(f"Recrawl: {stats['removed']} removed listings dropped from the index")
+        if index is not None:
+            print(f"Incremental: {stats['unchanged']} unchanged listings skipped")
+            print(f"Listing index updated: {stats['indexed']} listings, {len(index)} total")
+
+        print(fetcher.limiter.summary())
+        print(fetcher.latency_summary())
+        if cache is not None:
+            print(cache.summary())
+
+def search_item(category, page, slice_=None, probe=False, split=None):
+    """Work item for one search page (see work_queue.WorkQueue).
+
+    ``split`` (probes of child slices) carries the parent's total, the
+    depth and the number of splits in a row that did not narrow the search.
+    """
+    base = slice_.url(SEARCH_CATEGORIES[category]) if slice_ is not None else SEARCH_CATEGORIES[category]
+    payload = {"page": page, "slice": slice_.to_dict() if slice_ is not None else None}
+    if probe:
+        payload["probe"] = True
+    if split is not None:
+        payload["split"] = split
+    return ("search", category, build_page_url(base, page), payload)
+
+def coordinate(args, queue, output_dir, categories):
+    """Seed a shared work table and follow it until all work is done.
+
+    The run parameters (output directory, search URLs, pages, storage) are
+    stored in the table for the workers.  A table that is already seeded
+    is only followed, so a restarted coordinator picks up where it was.
+    """
+    if queue.get_meta("run") is None:
+        queue.set_meta("run", {
+            "output_dir": os.path.abspath(output_dir),
+            "categories": categories,
+            "search_urls": {category: SEARCH_CATEGORIES[category] for category in categories},
+            "start_page": args.start_page,
+            "end_page": args.end_page,
+            "partition": args.partition,
+            "page_cap": args.page_cap or args.end_page,
+            "storage": args.storage,
+            "shard_compression": args.shard_compression,
+            "shard_size": args.shard_size,
+        })
+        if args.partition:
+            seeds = [search_item(category, 1, Slice(category), probe=True) for category in categories]
+        else:
+            seeds = [search_item(category, args.start_page, probe=True) for category in categories]
+        queue.add(seeds)
+        for category in categories:
+            os.makedirs(os.path.join(category_dir(output_dir, category), "json_data"), exist_ok=True)
+        print(f"Work table {queue.path} seeded: {' '.join(categories)} -> {output_dir}")
+        print(f"Start workers with: python a.py --worker {queue.path}")
+    else:
+        output_dir = queue.get_meta("run")["output_dir"]
+        print(f"Work table {queue.path} already seeded, following it")
+
+    while not queue.is_finished():
+        time.sleep(args.progress_interval)
+        counts = queue.counts()
+        alive = [w for w in queue.workers() if w[1] < queue.lease]
+        print(" | ".join(
+            f"{kind}: " + ", ".join(f"{n} {state}" for state, n in sorted(states.items()))
+            for kind, states in counts.items() if states
+        ) + f" | {len(alive)} workers alive")
+
+    failures = queue.failures()
+    print(f"All work done: {sum(queue.counts()['detail'].values())} properties, "
+          f"{len(failures)} failed")
+    for worker, age, done, failed in queue.workers():
+        print(f"  {worker}: {done} done, {failed} failed, last heartbeat {age:.0f}s ago")
+    return output_dir
+
+async def work(args, queue, worker):
+    """Claim items from a shared work table and process them until it is finished.
+
+    Search page items add the remaining pages of their search (or the
+    child slices of a partition) and one detail item per link; detail items
+    save the property into the coordinator's output directory.  Results are
+    reported in batches, and a heartbeat every lease/3 seconds keeps the
+    claimed items leased.  On exit (or when the parse pool breaks)
+    unfinished items are released.
+    """
+    settings = queue.get_meta("run")
+    SEARCH_CATEGORIES.update(settings["search_urls"])
+    output_dir = settings["output_dir"]
+    page_cap = settings["page_cap"]
+    shards = None
+    if settings["storage"] == "shards":
+        shards = (settings["shard_compression"], settings["shard_size"] * 1024 * 1024)
+    pool = ParsePool(
+        workers=args.parse_workers,
+        queue_size=args.concurrency + (args.parse_queue or 2 * max(args.parse_workers or 0, 1)),
+    )
+    telemetry = CrawlTelemetry()
+    telemetry.info.update({"worker": worker, "work_table": queue.path,
+                           "concurrency": args.concurrency, "parse_workers": args.parse_workers})
+    results = {"done": [], "failed": [], "retry": [], "new_items": []}
+    stats = {"claimed": 0, "saved": 0}
+
+    async with AsyncFetcher(
+        DEFAULT_HEADERS, DEFAULT_COOKIES,
+        concurrency=args.concurrency, per_host=args.per_host,
+        start_concurrency=args.start_concurrency, retries=args.retries,
+        telemetry=telemetry,
+    ) as fetcher, pool:
+
+        async def search_page(id_, category, url, payload):
+            slice_ = Slice.from_dict(payload["slice"]) if payload["slice"] else None
+            meta = {} if payload.get("probe") else None
+            label = f"{slice_ or category} p{payload['page']}"
+            links = await process_page(fetcher, url, label, meta=meta, pool=pool)
+            if links is None:
+                results["retry"].append((id_, "search page failed", None))
+                return
+            telemetry.count("search_pages")
+            results["new_items"] += [
+                ("detail", category, link, {"id": listing_id_from_url(link)}) for link in links
+            ]
+            if meta is not None:
+                page_count, total = meta.get("page_count"), meta.get("total_count")
+                split = payload.get("split") or {"depth": 0, "stalls": 0, "total": None}
+                # Срез не меньше родителя: несколько раз подряд — сайт не применяет фильтр
+                stalls = split["stalls"] + 1 if (total is not None and split["total"] is not None
+                                                 and total >= split["total"]) else 0
+                children = []
+                if slice_ and page_count and page_count > page_cap:
+                    if split["depth"] >= MAX_SPLIT_DEPTH or stalls >= MAX_STALLED_SPLITS:
+                        print(f"[{slice_}] {page_count} pages, split limit reached: "
+                              f"crawling the first {page_cap}")
+                    else:
+                        # Без деления по спальням: воркер не видит итогов соседних срезов и
+                        # не заметил бы объявления без числа спален, выпавшие из них
+                        children = slice_.split(by_bedrooms=False)
+                if children:
+                    print(f"[{slice_}] {total} listings on {page_count} pages: "
+                          f"splitting into {len(children)} slices")
+                    child_split = {"depth": split["depth"] + 1, "stalls": stalls, "total": total}
+                    results["new_items"] += [search_item(category, 1, child, probe=True,
+                                                         split=child_split)
+                                             for child in children]
+                else:
+                    last = min(page_count or settings["end_page"],
+                               page_cap if slice_ else settings["end_page"])
+                    results["new_items"] += [search_item(category, n, slice_)
+                                             for n in range(payload["page"] + 1, last + 1)]
+            results["done"].append(id_)
+
+        async def detail_page(id_, category, url):
+            json_dir = os.path.join(category_dir(output_dir, category), "json_data")
+            error = await process_property(fetcher, url, json_dir, stats["saved"] + 1,
+                                           stats["claimed"], pool=pool, shards=shards)
+            if error is None:
+                stats["saved"] += 1
+                results["done"].append(id_)
+            elif error[1] in PERMANENT_STATUSES:
+                results["failed"].append((id_, *error))
+            else:
+                results["retry"].append((id_, *error))
+
+        async def handle(item):
+            id_, kind, category, url, payload = item
+            try:
+                if kind == "search":
+                    await search_page(id_, category, url, payload)
+                else:
+                    await detail_page(id_, category, url)
+            except Exception as e:
+                results["retry"].append((id_, f"{type(e).__name__}: {e}", None))
+
+        # Таблица может лежать на общем томе и ждать чужой блокировки до 60 с:
+        # запросы к ней идут в потоке, чтобы не останавливать загрузки
+        async def flush():
+            if any(results.values()):
+                batches = {key: batch[:] for key, batch in results.items()}
+                for batch in results.values():
+                    batch.clear()
+                telemetry.count("new_items", await asyncio.to_thread(queue.report, worker, **batches))
+
+        for category in settings["categories"]:
+            os.makedirs(os.path.join(category_dir(output_dir, category), "json_data"), exist_ok=True)
+        print(f"Worker {worker} on {queue.path}, saving to {output_dir}")
+        await asyncio.to_thread(queue.heartbeat, worker)
+        last_beat = time.monotonic()
+        in_flight = set()
+        try:
+            while True:
+                await flush()
+                if pool.broken:
+                    # A dead parse process: leave the work to the other workers
+                    print(f"Worker {worker}: parse pool is broken, releasing claimed work")
+                    break
+                if time.monotonic() - last_beat > queue.lease / 3:
+                    await asyncio.to_thread(queue.heartbeat, worker)
+                    last_beat = time.monotonic()
+                # Claim only what can start now (the limiter's current limit), so the
+                # first worker does not lease most of a small table
+                free = max(int(fetcher.limiter.limit), 1) - len(in_flight)
+                if free > 0 and (free >= max(int(fetcher.limiter.limit) // 4, 1) or not in_flight):
+                    items = await asyncio.to_thread(queue.claim, worker, free)
+                    stats["claimed"] += len(items)
+                    in_flight.update(asyncio.ensure_future(handle(item)) for item in items)
+                if not in_flight:
+                    if await asyncio.to_thread(queue.is_finished):
+                        break
+                    await asyncio.sleep(args.progress_interval / 10)
+                    continue
+                _, in_flight = await asyncio.wait(in_flight, timeout=0.5,
+                                                  return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            await flush()
+            queue.release(worker)
+            telemetry.count("saved", stats["saved"])
+            telemetry.info["concurrency_limit"] = int(fetcher.limiter.limit)
+            telemetry.info["concurrency_peak"] = int(fetcher.limiter.peak)
+            telemetry.finish()
+            telemetry.write_json(os.path.join(output_dir, f"telemetry-{worker}.json"))
+
+        print(f"Worker {worker}: saved {stats['saved']} properties of {stats['claimed']} claimed items")
+        print(fetcher.limiter.summary())
+        print(fetcher.latency_summary())
+
+def main(default_categories=("rent",)):
     parser = argparse.ArgumentParser(
         description="PropertyFinder.ae Scraper: Scrape, extract JSON, merge & transform"
     )
+    parser.add_argument("--category", action="append", choices=sorted(SEARCH_CATEGORIES),
+                      help="Search category to scrape, may be repeated "
+                           f"(default: {' '.join(default_categories)})")
     parser.add_argument("--threads", type=int, default=7, 
-                      help="Number of threads to use (default: 7)")
+                      help="Number of threads for parsing when --parse-workers is 0 (default: 7)")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1,
+                      help="Processes for HTML extraction and JSON writing, 0 = threads "
+                           "(default: number of CPUs)")
+    parser.add_argument("--parse-queue", type=int, default=None,
+                      help="Downloaded pages that may wait for a parse worker "
+                           "(default: 2 x parse workers)")
+    parser.add_argument("--transform-workers", type=int, default=None,
+                      help="Processes for the final transform into properties.json / .ndjson "
+                           "(default: --parse-workers)")
+    parser.add_argument("--concurrency", type=int, default=100,
+                      help="Maximum number of requests in flight (default: 100)")
+    parser.add_argument("--link-queue", type=int, default=None,
+                      help="Links that may wait between search pages and property fetches "
+                           "(default: 2 x concurrency)")
+    parser.add_argument("--start-concurrency", type=int, default=16,
+                      help="Initial concurrency of the adaptive limiter (default: 16)")
+    parser.add_argument("--retries", type=int, default=3,
+                      help="Retries per request on timeouts, 429 and 5xx (default: 3)")
+    parser.add_argument("--per-host", type=int, default=50,
+                      help="Maximum open connections per host (default: 50)")
     parser.add_argument("--start-page", type=int, default=1, 
                       help="Starting page number (default: 1)")
     parser.add_argument("--end-page", type=int, default=360, 
                       help="Ending page number (default: 360)")
     parser.add_argument("--output-dir", type=str, default="scraped_data",
                       help="Output directory (default: scraped_data)")
+    parser.add_argument("--max-empty-pages", type=int, default=3,
+                      help="Stop a category after N consecutive empty or 4xx pages (default: 3)")
+    parser.add_argument("--partition", action="store_true",
+                      help="Split the search by price, bedrooms and area until every slice "
+                           "fits within --page-cap pages, to reach listings past the page cap")
+    parser.add_argument("--page-cap", type=int, default=None,
+                      help="Most pages the site shows for one search, for --partition "
+                           "(default: --end-page)")
+    parser.add_argument("--incremental", action="store_true",
+                      help="Fetch only new listings and listings whose card price changed")
+    parser.add_argument("--index-file", type=str, default=None,
+                      help="Listing index for --incremental "
+                           "(default: <output-dir>/listing_index.sqlite)")
+    parser.add_argument("--recrawl", type=int, default=None, metavar="N",
+                      help="With --incremental: instead of the search, refetch the N indexed "
+                           "listings most likely to have changed (see recrawl.py)")
+    parser.add_argument("--index-seed", type=str, default=None,
+                      help="Seed the listing index from a properties.json / scrape directory")
+    parser.add_argument("--cards-only", action="store_true",
+                      help="Take listings from the search page cards; fetch property pages "
+                           "only for listings not in the seen set (see --seen-file)")
+    parser.add_argument("--skip-seen", action="store_true",
+                      help="Fetch only listings that no earlier run (rent or sale) has saved")
+    parser.add_argument("--seen-file", type=str, default=None,
+                      help="Seen set for --skip-seen, shared by all runs and categories "
+                           "(default: <output-dir>/seen_listings)")
+    parser.add_argument("--seen-error-rate", type=float, default=DEFAULT_ERROR_RATE,
+                      help="False-positive rate of the seen set's Bloom filter; positives are "
+                           f"checked against the exact id file (default: {DEFAULT_ERROR_RATE})")
+    parser.add_argument("--resume", type=str, default=None, metavar="SCRAPE_DIR",
+                      help="Continue an interrupted run in SCRAPE_DIR from its journal")
+    parser.add_argument("--retry-failed", type=str, default=None, metavar="SCRAPE_DIR",
+                      help="Fetch only the property pages quarantined by an earlier run in SCRAPE_DIR")
+    parser.add_argument("--coordinator", type=str, default=None, metavar="WORK_DB",
+                      help="Seed a shared work table (SQLite on a volume all workers mount) "
+                           "and wait until the workers have done all work")
+    parser.add_argument("--worker", type=str, default=None, metavar="WORK_DB",
+                      help="Process work claimed from the shared work table of a coordinator")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE,
+                      help="Seconds a claimed item stays leased without a worker heartbeat "
+                           f"(default: {DEFAULT_LEASE:g})")
+    parser.add_argument("--progress-interval", type=float, default=10.0,
+                      help="Seconds between coordinator progress lines (default: 10)")
+    parser.add_argument("--retry-rounds", type=int, default=2,
+                      help="Retry failed property pages N times at the end of the run (default: 2)")
+    parser.add_argument("--retry-backoff", type=float, default=30.0,
+                      help="Wait before the first retry round, doubled each round, s (default: 30)")
+    parser.add_argument("--cache-dir", type=str, default=None,
+                      help="Cache HTTP responses in this directory (default: no cache)")
+    parser.add_argument("--cache-ttl", type=int, default=DEFAULT_TTL,
+                      help="Serve cached responses younger than N seconds without a request; "
+                           f"older ones are revalidated (default: {DEFAULT_TTL})")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                      help="Evict least recently used responses above N MB "
+                           f"(default: {DEFAULT_MAX_BYTES // (1024 * 1024)})")
+    parser.add_argument("--record", type=str, default=None, metavar="FIXTURES_DIR",
+                      help="Save every search and detail response as a fixture "
+                           "for standin_server.py")
+    parser.add_argument("--base-url", type=str, default=None,
+                      help="Fetch from another origin, e.g. http://127.0.0.1:8765 "
+                           "for standin_server.py")
+    parser.add_argument("--metrics-file", type=str, default=None,
+                      help="Also write run telemetry in the Prometheus text format to this file "
+                           "(telemetry.json is always written to the scrape directory)")
+    parser.add_argument("--storage", choices=("files", "shards"), default="files",
+                      help="Raw listings as one .json file each, or appended to compressed "
+                           "NDJSON shards (default: files)")
+    parser.add_argument("--shard-compression", choices=("gzip", "zstd"), default="gzip",
+                      help="Compression of the shards; zstd needs the zstandard package "
+                           "(default: gzip)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE // (1024 * 1024),
+                      help="Start a new shard after N MB (default: 256)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="json",
+                      help="Transformed output: properties.json (JSON array) or properties.ndjson, "
+                           "one record per line, optionally gzip / zstd compressed (default: json)")
+    parser.add_argument("--parquet-dir", default=None,
+                      help="Also export the transformed listings to this Parquet dataset "
+                           "(snapshot=<scrape dir>/priceDuration=...), needs pyarrow")
     
     args = parser.parse_args()
+    if sum(bool(mode) for mode in (args.resume, args.retry_failed, args.coordinator, args.worker)) > 1:
+        parser.error("--resume, --retry-failed, --coordinator and --worker are mutually exclusive")
+    if args.recrawl and not args.incremental:
+        parser.error("--recrawl needs --incremental (it schedules from the listing index)")
+    if (args.skip_seen or args.cards_only) and args.incremental:
+        parser.error("--skip-seen / --cards-only skip known listings, --incremental refetches "
+                     "changed ones: use one of them")
+    transform_workers = args.parse_workers if args.transform_workers is None else args.transform_workers
+
+    if args.worker:
+        queue = WorkQueue(args.worker, lease=args.lease)
+        if queue.get_meta("run") is None:
+            parser.error(f"{args.worker} is not seeded, start a.py --coordinator first")
+        try:
+            run(work(args, queue, worker_id()), threads=args.threads)
+        finally:
+            queue.close()
+        return
+
+    if args.resume or args.retry_failed:
+        # Restore the parameters of the interrupted run
+        output_dir = args.resume or args.retry_failed
+        if not CrawlJournal.exists(output_dir):
+            parser.error(f"no crawl journal in {output_dir}")
+        journal = CrawlJournal(output_dir)
+        saved = journal.get_meta("run", {})
+        categories = saved.get("categories") or list(default_categories)
+        args.start_page = saved.get("start_page", args.start_page)
+        args.end_page = saved.get("end_page", args.end_page)
+        args.incremental = args.incremental or saved.get("incremental", False)
+        args.storage = saved.get("storage", args.storage)
+        args.shard_compression = saved.get("shard_compression", args.shard_compression)
+        args.partition = saved.get("partition", args.partition)
+        args.skip_seen = args.skip_seen or saved.get("skip_seen", False)
+        args.cards_only = args.cards_only or saved.get("cards_only", False)
+        args.page_cap = saved.get("page_cap", args.page_cap)
+        if args.resume:
+            print(f"Resuming {output_dir}: {' '.join(categories)}, "
+                  f"pages {args.start_page}-{args.end_page}")
+    else:
+        categories = list(dict.fromkeys(args.category or default_categories))
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_dir = os.path.join(args.output_dir, f"scrape_{ts}")
+
+    zstd_flag = ("--shard-compression zstd"
+                 if args.storage == "shards" and args.shard_compression == "zstd"
+                 else "--output-format ndjson.zst" if args.output_format.endswith(".zst") else None)
+    if zstd_flag and zstandard is None:
+        parser.error(f"{zstd_flag} needs the zstandard package")
+    output_name = f"properties.{args.output_format}"
+    if args.parquet_dir and columnar.pyarrow is None:
+        parser.error("--parquet-dir needs the pyarrow package")
+
+    if args.base_url:
+        for category, url in SEARCH_CATEGORIES.items():
+            SEARCH_CATEGORIES[category] = rebase_url(url, args.base_url)
+
+    if args.coordinator:
+        queue = WorkQueue(args.coordinator, lease=args.lease)
+        try:
+            output_dir = coordinate(args, queue, output_dir, categories)
+            settings = queue.get_meta("run")
+        finally:
+            queue.close()
+        for category in settings["categories"]:
+            cat_dir = category_dir(output_dir, category)
+            process_directory(os.path.join(cat_dir, "json_data"),
+                              os.path.join(cat_dir, output_name), ext=".json",
+                              workers=transform_workers)
+        if args.parquet_dir:
+            export_parquet(output_dir, args.parquet_dir)
+        print(f"Results saved in: {output_dir}")
+        return
 
     # Create output directories
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_dir = os.path.join(args.output_dir, f"scrape_{ts}")
-    links_file = os.path.join(output_dir, "links.txt")
-    json_dir = os.path.join(output_dir, "json_data")
-    
-    os.makedirs(output_dir, exist_ok=True)
-    os.makedirs(json_dir, exist_ok=True)
+    for category in categories:
+        os.makedirs(os.path.join(category_dir(output_dir, category), "json_data"), exist_ok=True)
 
-    # Initialize session with default headers and cookies
-    session = requests.Session()
-    session.headers.update(DEFAULT_HEADERS)
-    session.cookies.update(DEFAULT_COOKIES)
+    if not (args.resume or args.retry_failed):
+        journal = CrawlJournal(output_dir)
+        journal.set_meta("run", {
+            "categories": categories,
+            "start_page": args.start_page,
+            "end_page": args.end_page,
+            "incremental": args.incremental,
+            "storage": args.storage,
+            "shard_compression": args.shard_compression,
+            "partition": args.partition,
+            "page_cap": args.page_cap,
+            "skip_seen": args.skip_seen,
+            "cards_only": args.cards_only,
+        })
 
-    # 1) Gather links from all pages in parallel
-    all_links = set()
-    page_range = range(args.start_page, args.end_page + 1)
-    
-    print(f"Starting to scrape {len(page_range)} pages with {args.threads} threads...")
-    
-    with ThreadPoolExecutor(max_workers=args.threads) as executor:
-        futures = []
-        for page_num in page_range:
-            url = build_page_url(BASE_SEARCH_URL, page_num)
-            futures.append(executor.submit(process_page, session, url, page_num))
-        
-        for future in as_completed(futures):
-            links = future.result()
-            if links:
-                all_links.update(links)
+    index = None
+    if args.incremental:
+        base_dir = os.path.dirname(os.path.normpath(output_dir))
+        index = ListingIndex(args.index_file or os.path.join(base_dir, "listing_index.sqlite"))
+        if args.index_seed:
+            print(f"Seeded listing index with {index.seed_from_json(args.index_seed)} listings")
+        print(f"Incremental mode: {len(index)} listings in {index.path}")
 
-    # Save all links to file
-    with open(links_file, "w", encoding="utf-8") as lf:
-        for l in sorted(all_links):
-            lf.write(l + "\n")
-    print(f"Saved {len(all_links)} links to {links_file}")
+    known = None
+    if args.skip_seen or args.cards_only:
+        base_dir = os.path.dirname(os.path.normpath(output_dir))
+        known = SeenSet(args.seen_file or os.path.join(base_dir, "seen_listings"),
+                        error_rate=args.seen_error_rate)
+        print(f"Seen set: {len(known)} listings in {known.path}")
 
-    # 2) Process all properties in parallel
-    print(f"Processing {len(all_links)} properties with {args.threads} threads...")
-    
-    with ThreadPoolExecutor(max_workers=args.threads) as executor:
-        futures = []
-        for idx, link in enumerate(sorted(all_links), 1):
-            futures.append(executor.submit(
-                process_property, session, link, json_dir, idx, len(all_links)
-            ))
-        
-        # Wait for all futures to complete
-        for future in as_completed(futures):
-            pass  # Results are handled in the process_property function
+    recorder = FixtureRecorder(args.record) if args.record else None
+    cache = None
+    if args.cache_dir:
+        cache = ResponseCache(args.cache_dir, ttl=args.cache_ttl,
+                              max_bytes=args.cache_size * 1024 * 1024)
+
+    # 1-2) Fetch search and property pages
+    try:
+        run(crawl(args, output_dir, categories, index=index, journal=journal,
+                  cache=cache, recorder=recorder, retry_only=bool(args.retry_failed), known=known),
+            threads=args.threads)
+    finally:
+        journal.close()
+        if index is not None:
+            index.close()
+        if known is not None:
+            known.close()
+        if cache is not None:
+            cache.close()
+        if recorder is not None:
+            print(f"Recorded {recorder.recorded} responses to {args.record}")
+            recorder.close()
 
     # 3) Transform & dedupe into final output
-    final_out = os.path.join(output_dir, "properties.json")
-    process_directory(json_dir, final_out, ext=".json")
+    for category in categories:
+        cat_dir = category_dir(output_dir, category)
+        final_out = os.path.join(cat_dir, output_name)
+        process_directory(os.path.join(cat_dir, "json_data"), final_out, ext=".json",
+                          cards_file=os.path.join(cat_dir, CARDS_FILE), workers=transform_workers)
+    if args.parquet_dir:
+        export_parquet(output_dir, args.parquet_dir)
 
     print("Scraping completed successfully!")
     print(f"Results saved in: {output_dir}")
     time.sleep(0.36)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
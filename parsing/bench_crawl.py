@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark a.py end to end against the local stand-in server.
+
+Starts standin_server.py, runs a full a.py crawl against it and reports
+search pages/s, listings/s and p50/p99 fetch latency, read from the
+run's telemetry.json.  Arguments after ``--`` are passed to a.py::
+
+    python bench_crawl.py
+    python bench_crawl.py --pages 100 --latency 120 --error-429 0.02 -- --concurrency 200
+    python bench_crawl.py --fixtures /path/to/recorded -- --category sale --category rent
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("stand-in server exited")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"stand-in server did not listen on port {port}")
+
+
+def main():
+    argv = sys.argv[1:]
+    a_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, a_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description="Benchmark a.py against standin_server.py")
+    parser.add_argument("--fixtures", default=None,
+                        help="Recorded responses or templates (default: the server's fixtures/)")
+    parser.add_argument("--pages", type=int, default=20,
+                        help="Search pages per category in template mode (default: 20)")
+    parser.add_argument("--latency", type=float, default=50.0, help="Mean latency, ms (default: 50)")
+    parser.add_argument("--jitter", type=float, default=20.0, help="Latency jitter, ms (default: 20)")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Share of 429 answers")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="Share of 500/502 answers")
+    parser.add_argument("--timeouts", type=float, default=0.0, help="Share of held requests")
+    parser.add_argument("--timeout-delay", type=float, default=60.0,
+                        help="How long a held request waits, s (default: 60)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scrape output directory")
+    args = parser.parse_args(argv)
+
+    port = free_port()
+    server_cmd = [
+        sys.executable, os.path.join(HERE, "standin_server.py"), "--port", str(port),
+        "--pages", str(args.pages), "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--error-429", str(args.error_429), "--error-5xx", str(args.error_5xx),
+        "--timeouts", str(args.timeouts), "--timeout-delay", str(args.timeout_delay), "--seed", "1",
+    ]
+    if args.fixtures:
+        server_cmd += ["--fixtures", args.fixtures]
+    output_dir = tempfile.mkdtemp(prefix="bench_crawl_")
+    server = subprocess.Popen(server_cmd, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, server)
+        crawl_cmd = [
+            sys.executable, os.path.join(HERE, "a.py"),
+            "--base-url", f"http://127.0.0.1:{port}", "--output-dir", output_dir,
+            "--end-page", str(args.pages),
+        ] + a_args
+        start = time.perf_counter()
+        result = subprocess.run(crawl_cmd, capture_output=True, text=True, cwd=HERE)
+        elapsed = time.perf_counter() - start
+        telemetry = {}
+        for path in glob.glob(os.path.join(output_dir, "scrape_*", "telemetry.json")):
+            with open(path, "r", encoding="utf-8") as f:
+                telemetry = json.load(f)
+    finally:
+        server.terminate()
+        server.wait()
+        if not args.keep:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    if result.returncode != 0:
+        sys.stdout.write(result.stdout[-2000:])
+        sys.stderr.write(result.stderr[-2000:])
+        raise SystemExit(f"a.py exited with {result.returncode}")
+
+    counts = telemetry.get("counts", {})
+    pages = counts.get("search_pages", 0)
+    listings = counts.get("saved", 0)
+    fetch = telemetry.get("histograms", {}).get("fetch", {})
+    print(f"a.py {' '.join(a_args)}".rstrip())
+    print(f"  wall time      {elapsed:8.2f} s")
+    print(f"  search pages   {pages:8d}  {pages / elapsed:8.1f} pages/s")
+    print(f"  listings       {listings:8d}  {listings / elapsed:8.1f} listings/s")
+    if fetch.get("count"):
+        print(f"  fetch latency  p50 {fetch['p50'] * 1000:.1f} ms, p99 {fetch['p99'] * 1000:.1f} ms")
+    if telemetry:
+        print(f"  requests       {telemetry['requests']}, {telemetry['retries']} retries")
+    if args.keep:
+        print(f"  output         {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark the fast extractors (extract.py) against the BeautifulSoup path.
+
+Runs both implementations over saved HTML fixtures, checks that they give
+the same result and prints pages/s for each.  Fixture names decide what is
+measured: ``search_*.html`` -> card links, ``detail_*.html`` -> embedded
+JSON of the first body script.
+
+    python bench_extract.py
+    python bench_extract.py --fixtures /path/to/recorded/pages --repeat 200
+"""
+
+import os
+import glob
+import time
+import argparse
+
+from extract import (
+    extract_links_from_page, extract_links_from_page_bs4,
+    extract_first_script, extract_first_script_bs4,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+CASES = {
+    "search": ("links", extract_links_from_page_bs4, extract_links_from_page),
+    "detail": ("first script", extract_first_script_bs4, extract_first_script),
+}
+
+
+def measure(func, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return repeat / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML extraction: bs4 vs fast path")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR,
+                        help="Directory with search_*.html / detail_*.html (default: fixtures/)")
+    parser.add_argument("--repeat", type=int, default=50,
+                        help="Iterations per fixture (default: 50)")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.fixtures, "*.html")))
+    if not files:
+        parser.error(f"no *.html fixtures in {args.fixtures}")
+
+    print(f"{'fixture':40} {'what':12} {'KB':>6} {'bs4 p/s':>10} {'fast p/s':>10} {'speedup':>8}")
+    for path in files:
+        kind = os.path.basename(path).split("_", 1)[0]
+        if kind not in CASES:
+            continue
+        what, slow, fast = CASES[kind]
+        with open(path, "rb") as f:
+            body = f.read()
+        text = body.decode("utf-8")
+        # bs4 gets the decoded text (as before), the fast path the raw bytes
+        if slow(text) != fast(body):
+            print(f"{os.path.basename(path):40} MISMATCH between bs4 and fast extraction")
+            continue
+        slow_rate = measure(slow, text, args.repeat)
+        fast_rate = measure(fast, body, args.repeat)
+        print(f"{os.path.basename(path):40} {what:12} {len(body) // 1024:>6} "
+              f"{slow_rate:>10.1f} {fast_rate:>10.1f} {fast_rate / slow_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmark the declarative field mapping (field_map.py) against the hand-written transform.
+
+Both layouts are measured: property pages (``detail_*.html`` fixtures or
+the .json files of a json_data directory) and bare property objects (the
+cards of ``search_*.html`` fixtures).  The two implementations must give
+the same records; the script prints records/s for each.
+
+    python bench_transform.py
+    python bench_transform.py --input scraped_data/scrape_20241213_143022/sale_listings/json_data
+"""
+
+import os
+import glob
+import json
+import time
+import argparse
+
+from extract import extract_next_data, search_listings
+from field_map import transform_property
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def transform_property_manual(data):
+    """The transform as hand-written .get() chains (the former take_all / a.py code)."""
+    if "props" in data:
+        prop = data.get("props", {}).get("pageProps", {}).get("propertyResult", {}).get("property", {})
+    else:
+        prop = data
+
+    property_id = prop.get("id")
+    url = prop.get("share_url")
+    title = prop.get("title")
+    display_address = prop.get("location", {}).get("full_name")
+    bedrooms = prop.get("bedrooms")
+    bathrooms = prop.get("bathrooms")
+    added_on = prop.get("listed_date")
+    broker_name = prop.get("broker", {}).get("name")
+    agent_name = prop.get("agent", {}).get("name")
+    agent_info = prop.get("agent", {})
+
+    agent_phone = None
+    for c in prop.get("contact_options", []):
+        if c.get("type") == "phone":
+            agent_phone = c.get("value")
+            break
+
+    verified = prop.get("is_verified")
+    reference = prop.get("reference")
+    broker_license = prop.get("broker", {}).get("license_number")
+    broker_info = prop.get("broker", {})
+    price_duration = "rent" if prop.get("isRent") else "sell"
+    property_type = prop.get("property_type")
+    price = prop.get("price", {}).get("value")
+    rera_obj = prop.get("rera", {}) or {}
+    rera_number = rera_obj.get("number")
+    price_currency = prop.get("price", {}).get("currency")
+
+    coord = prop.get("location", {}).get("coordinates", {}) or {}
+    coordinates = {
+        "latitude": coord.get("lat"),
+        "longitude": coord.get("lon"),
+    }
+
+    offering_type = prop.get("offering_type")
+    size_val = prop.get("size", {}).get("value")
+    size_unit = prop.get("size", {}).get("unit")
+    size_min = f"{size_val} {size_unit}" if size_val and size_unit else None
+
+    furnishing = prop.get("furnished", "NO").upper()
+
+    features = [
+        a.get("name")
+        for a in prop.get("amenities", [])
+        if a.get("name")
+    ]
+
+    description = prop.get("description")
+    description_html = prop.get("descriptionHTML") or description
+
+    images = [
+        img.get("full")
+        for img in prop.get("images", {}).get("property", [])
+        if img.get("full")
+    ]
+
+    similar_transactions = prop.get("similar_price_transactions")
+    rera_permit_url = rera_obj.get("permit_validation_url")
+
+    return {
+        "id": property_id,
+        "url": url,
+        "title": title,
+        "displayAddress": display_address,
+        "bedrooms": bedrooms,
+        "bathrooms": bathrooms,
+        "addedOn": added_on,
+        "broker": broker_name,
+        "agent": agent_name,
+        "agentInfo": agent_info,
+        "agentPhone": agent_phone,
+        "verified": verified,
+        "reference": reference,
+        "brokerLicenseNumber": broker_license,
+        "brokerInfo": broker_info,
+        "priceDuration": price_duration,
+        "propertyType": property_type,
+        "price": price,
+        "rera": rera_number,
+        "priceCurrency": price_currency,
+        "coordinates": coordinates,
+        "type": offering_type,
+        "sizeMin": size_min,
+        "furnishing": furnishing,
+        "features": features,
+        "description": description,
+        "descriptionHTML": description_html,
+        "images": images,
+        "similarTransactions": similar_transactions,
+        "reraPermitUrl": rera_permit_url,
+    }
+
+
+def load_cases(fixtures, input_dir, limit):
+    cases = {}
+    pages, cards = [], []
+    for path in sorted(glob.glob(os.path.join(fixtures, "*.html"))):
+        with open(path, "rb") as f:
+            data = extract_next_data(f.read())
+        if os.path.basename(path).startswith("detail_"):
+            pages.append(data)
+        elif os.path.basename(path).startswith("search_"):
+            cards.extend(search_listings(data))
+    if input_dir:
+        for path in sorted(glob.glob(os.path.join(input_dir, "**", "*.json"), recursive=True))[:limit]:
+            with open(path, "r", encoding="utf-8") as f:
+                pages.append(json.load(f))
+    if pages:
+        cases["page"] = pages
+    if cards:
+        cases["card"] = cards
+    return cases
+
+
+def measure(func, records, min_time):
+    n = 0
+    start = time.perf_counter()
+    while True:
+        for data in records:
+            func(data)
+        n += len(records)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark transform_property: hand-written vs field_map")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR,
+                        help="Directory with detail_*.html / search_*.html (default: fixtures/)")
+    parser.add_argument("--input", default=None,
+                        help="Also measure the .json files of this directory (e.g. json_data)")
+    parser.add_argument("--limit", type=int, default=5000,
+                        help="Files to load from --input (default: 5000)")
+    parser.add_argument("--seconds", type=float, default=2.0,
+                        help="Minimum time per measurement (default: 2)")
+    args = parser.parse_args()
+
+    cases = load_cases(args.fixtures, args.input, args.limit)
+    if not cases:
+        parser.error(f"no fixtures in {args.fixtures} and no --input")
+
+    print(f"{'layout':8} {'records':>8} {'manual rec/s':>14} {'field_map rec/s':>16} {'speedup':>8}")
+    for layout, records in cases.items():
+        mismatches = sum(transform_property(d) != transform_property_manual(d) for d in records)
+        if mismatches:
+            print(f"{layout:8} {mismatches} MISMATCHES between hand-written and field_map transform")
+            continue
+        manual = measure(transform_property_manual, records, args.seconds)
+        mapped = measure(transform_property, records, args.seconds)
+        print(f"{layout:8} {len(records):>8} {manual:>14.0f} {mapped:>16.0f} {mapped / manual:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Columnar (Parquet) export of transformed listings for offline analysis.
+
+Each snapshot is written as a hive-partitioned Parquet dataset::
+
+    <dataset>/snapshot=scrape_20241213_143022/priceDuration=rent/part-0.parquet
+    <dataset>/snapshot=scrape_20241213_143022/priceDuration=sell/part-0.parquet
+
+Columns are typed: ``price`` int64, ``latitude`` / ``longitude`` float64,
+``bedrooms`` / ``bathrooms`` int16, ``areaSqft`` float64 parsed from
+``sizeMin`` ("1234 sqft", "115 sqm"), ``addedOn`` a UTC timestamp, and
+``features`` / ``images`` list<string>.  Free-form objects (agentInfo,
+brokerInfo, similarTransactions) are kept as JSON strings.  Rows are
+buffered per partition and written in row groups of ``ROW_GROUP_SIZE``, so
+memory does not grow with the snapshot.
+
+A year of daily snapshots is one dataset: scans read only the columns and
+partitions they need, e.g. with pyarrow::
+
+    import pyarrow.dataset as ds
+    data = ds.dataset("listings_parquet", format="parquet", partitioning="hive")
+    data.to_table(columns=["snapshot", "id", "price"], filter=ds.field("priceDuration") == "rent")
+
+Input is transformed output (properties.json, properties.ndjson[.gz|.zst],
+take_all.py output) or a ``scrape_<ts>`` directory::
+
+    python columnar.py scraped_data/scrape_20241213_143022 --output-dir listings_parquet
+
+Needs the optional ``pyarrow`` package.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timezone
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from listing_index import normalize_timestamp
+from shards import is_ndjson, iter_json_array, iter_ndjson_records
+from snapshot_diff import LISTINGS_SUFFIX, TRANSFORMED_FILES
+
+# Строк в одной группе строк Parquet (на раздел)
+ROW_GROUP_SIZE = 50000
+SQFT_PER_SQM = 10.7639
+# Тип объявления по папке категории a.py (надёжнее поля isRent исходных данных)
+CATEGORY_DURATION = {"rent": "rent", "sale": "sell"}
+PART_FILE = "part-0.parquet"
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs the 'pyarrow' package (pip install pyarrow)")
+
+
+# --- value parsing ---
+
+def parse_int(value):
+    """Integer from a number or a numeric string ("1,250,000"), or None."""
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(round(value)) if math.isfinite(value) else None
+    try:
+        return int(round(float(str(value).replace(",", ""))))
+    except ValueError:
+        return None
+
+
+def parse_float(value):
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def parse_rooms(value):
+    """Bedrooms / bathrooms: 2, "2", "7+" -> 7, "studio" -> 0."""
+    if isinstance(value, str):
+        if value.strip().lower() == "studio":
+            return 0
+        match = _NUMBER_RE.search(value)
+        return int(float(match.group().replace(",", "."))) if match else None
+    return parse_int(value)
+
+
+def parse_area(size_min):
+    """Area in sqft from sizeMin ("1234 sqft", "115 sqm"), or None."""
+    if not isinstance(size_min, str):
+        return parse_float(size_min)
+    text = size_min.replace(",", "")
+    match = _NUMBER_RE.search(text)
+    if match is None:
+        return None
+    area = float(match.group())
+    unit = text[match.end():].strip().lower()
+    if unit.startswith(("sqm", "m2", "m²", "sq m")):
+        area *= SQFT_PER_SQM
+    return area
+
+
+def parse_time(value):
+    ts = normalize_timestamp(value)
+    return datetime.fromtimestamp(ts, timezone.utc) if ts is not None else None
+
+
+def _json_text(value):
+    return json.dumps(value, ensure_ascii=False) if value not in (None, {}, []) else None
+
+
+def _strings(values):
+    return [str(v) for v in values if v is not None] if isinstance(values, list) else []
+
+
+def _coordinate(record, key):
+    coordinates = record.get("coordinates")
+    return parse_float(coordinates.get(key)) if isinstance(coordinates, dict) else None
+
+
+# Колонки: имя, тип pyarrow (строкой), значение из записи take_all / a.py
+COLUMNS = (
+    ("id", "string", lambda r: None if r.get("id") is None else str(r["id"])),
+    ("url", "string", lambda r: r.get("url")),
+    ("title", "string", lambda r: r.get("title")),
+    ("displayAddress", "string", lambda r: r.get("displayAddress")),
+    ("propertyType", "string", lambda r: r.get("propertyType")),
+    ("type", "string", lambda r: r.get("type")),
+    ("bedrooms", "int16", lambda r: parse_rooms(r.get("bedrooms"))),
+    ("bathrooms", "int16", lambda r: parse_rooms(r.get("bathrooms"))),
+    ("sizeMin", "string", lambda r: r.get("sizeMin")),
+    ("areaSqft", "float64", lambda r: parse_area(r.get("sizeMin"))),
+    ("price", "int64", lambda r: parse_int(r.get("price"))),
+    ("priceCurrency", "string", lambda r: r.get("priceCurrency")),
+    ("latitude", "float64", lambda r: _coordinate(r, "latitude")),
+    ("longitude", "float64", lambda r: _coordinate(r, "longitude")),
+    ("addedOn", "timestamp", lambda r: parse_time(r.get("addedOn"))),
+    ("furnishing", "string", lambda r: r.get("furnishing")),
+    ("verified", "bool", lambda r: None if r.get("verified") is None else bool(r["verified"])),
+    ("reference", "string", lambda r: r.get("reference")),
+    ("rera", "string", lambda r: None if r.get("rera") is None else str(r["rera"])),
+    ("reraPermitUrl", "string", lambda r: r.get("reraPermitUrl")),
+    ("broker", "string", lambda r: r.get("broker")),
+    ("brokerLicenseNumber", "string",
+     lambda r: None if r.get("brokerLicenseNumber") is None else str(r["brokerLicenseNumber"])),
+    ("agent", "string", lambda r: r.get("agent")),
+    ("agentPhone", "string", lambda r: r.get("agentPhone")),
+    ("features", "list<string>", lambda r: _strings(r.get("features"))),
+    ("images", "list<string>", lambda r: _strings(r.get("images"))),
+    ("description", "string", lambda r: r.get("description")),
+    ("agentInfo", "json", lambda r: _json_text(r.get("agentInfo"))),
+    ("brokerInfo", "json", lambda r: _json_text(r.get("brokerInfo"))),
+    ("similarTransactions", "json", lambda r: _json_text(r.get("similarTransactions"))),
+)
+
+
+def arrow_schema():
+    """pyarrow schema of the exported columns (partition keys are not stored in files)."""
+    _require_pyarrow()
+    types = {
+        "string": pyarrow.string(),
+        "json": pyarrow.string(),
+        "int16": pyarrow.int16(),
+        "int64": pyarrow.int64(),
+        "float64": pyarrow.float64(),
+        "bool": pyarrow.bool_(),
+        "timestamp": pyarrow.timestamp("s", tz="UTC"),
+        "list<string>": pyarrow.list_(pyarrow.string()),
+    }
+    return pyarrow.schema([(name, types[kind]) for name, kind, _ in COLUMNS])
+
+
+class ParquetSnapshotWriter:
+    """Writes the records of one snapshot, one Parquet file per priceDuration.
+
+    An earlier export of the same snapshot is replaced.
+    """
+
+    def __init__(self, dataset_dir, snapshot, row_group_size=ROW_GROUP_SIZE, compression="zstd"):
+        _require_pyarrow()
+        self.snapshot_dir = os.path.join(dataset_dir, f"snapshot={snapshot}")
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+        self.snapshot = snapshot
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.schema = arrow_schema()
+        self.buffers = {}
+        self.writers = {}
+        self.counts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, record, duration=None):
+        """Add one transformed record; ``duration`` overrides its priceDuration."""
+        duration = duration or record.get("priceDuration") or "unknown"
+        columns = self.buffers.get(duration)
+        if columns is None:
+            columns = self.buffers[duration] = [[] for _ in COLUMNS]
+        for values, (_, _, get) in zip(columns, COLUMNS):
+            values.append(get(record))
+        if len(columns[0]) >= self.row_group_size:
+            self._flush(duration)
+
+    def _flush(self, duration):
+        columns = self.buffers.get(duration)
+        if not columns or not columns[0]:
+            return
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        writer = self.writers.get(duration)
+        if writer is None:
+            part_dir = os.path.join(self.snapshot_dir, f"priceDuration={duration}")
+            os.makedirs(part_dir, exist_ok=True)
+            writer = self.writers[duration] = pyarrow.parquet.ParquetWriter(
+                os.path.join(part_dir, PART_FILE), self.schema, compression=self.compression)
+        writer.write_table(table, row_group_size=self.row_group_size)
+        self.counts[duration] = self.counts.get(duration, 0) + table.num_rows
+        self.buffers[duration] = [[] for _ in COLUMNS]
+
+    def close(self):
+        for duration in list(self.buffers):
+            self._flush(duration)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+def iter_records(path):
+    """Records of a transformed output file (JSON array or NDJSON), streamed."""
+    if is_ndjson(path):
+        return iter_ndjson_records(path)
+    return iter_json_array(path)
+
+
+def _duration_of_dir(directory):
+    """priceDuration of an a.py "<category>_listings" directory, or None."""
+    name = os.path.basename(os.path.normpath(directory))
+    if name.endswith(LISTINGS_SUFFIX):
+        return CATEGORY_DURATION.get(name[:-len(LISTINGS_SUFFIX)])
+    return None
+
+
+def snapshot_inputs(path):
+    """[(file, priceDuration or None)] of transformed output under a snapshot path."""
+    if os.path.isfile(path):
+        return [(path, _duration_of_dir(os.path.dirname(os.path.abspath(path))))]
+    inputs = []
+    for dirpath, dirnames, files in os.walk(path):
+        dirnames.sort()
+        for transformed in TRANSFORMED_FILES:
+            if transformed in files:
+                inputs.append((os.path.join(dirpath, transformed), _duration_of_dir(dirpath)))
+                break
+    return inputs
+
+
+def snapshot_name(path):
+    """Default snapshot name: the scrape directory ("scrape_<ts>") of ``path``."""
+    directory = os.path.abspath(path)
+    if os.path.isfile(directory):
+        directory = os.path.dirname(directory)
+    if os.path.basename(directory).endswith(LISTINGS_SUFFIX):
+        directory = os.path.dirname(directory)
+    return os.path.basename(directory)
+
+
+def export_snapshot(path, dataset_dir, snapshot=None, row_group_size=ROW_GROUP_SIZE):
+    """Export a snapshot (scrape dir or transformed file) to ``dataset_dir``; returns {priceDuration: rows}."""
+    snapshot = snapshot or snapshot_name(path)
+    with ParquetSnapshotWriter(dataset_dir, snapshot, row_group_size) as writer:
+        for file_path, duration in snapshot_inputs(path):
+            for record in iter_records(file_path):
+                if isinstance(record, dict):
+                    writer.write(record, duration)
+    return writer.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export transformed listings to a Parquet dataset")
+    parser.add_argument("input", nargs="+",
+                        help="scrape_<ts> directories or transformed files (properties.json / .ndjson)")
+    parser.add_argument("--output-dir", required=True, help="Parquet dataset directory")
+    parser.add_argument("--snapshot", default=None,
+                        help="Snapshot name (default: name of the scrape directory); "
+                             "only with a single input")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE,
+                        help=f"Rows per row group (default: {ROW_GROUP_SIZE})")
+    args = parser.parse_args()
+
+    if pyarrow is None:
+        parser.error("Parquet export needs the pyarrow package (pip install pyarrow)")
+    if args.snapshot and len(args.input) > 1:
+        parser.error("--snapshot needs a single input")
+    for path in args.input:
+        start = time.perf_counter()
+        counts = export_snapshot(path, args.output_dir, args.snapshot, args.row_group_size)
+        rows = ", ".join(f"{duration} {n}" for duration, n in sorted(counts.items())) or "no rows"
+        print(f"{path}: {rows} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Extraction of links and embedded JSON from PropertyFinder pages.
+
+The scraper only needs two things from a page: the embedded JSON payload
+and the property card links of a search page.  Neither needs a full
+BeautifulSoup DOM:
+
+* the JSON of the first ``<script>`` in ``<body>`` (and the
+  ``__NEXT_DATA__`` script) is cut out of the raw bytes with a forward
+  scan that stops at the closing ``</script>``;
+* card links are selected with one compiled XPath over lxml's C tree.
+
+Likewise snapshot_diff.py reads the id, URL and price of a saved property
+page from its JSON text with byte regexes (:func:`property_key`) instead
+of parsing it.
+
+All functions accept ``bytes`` (the raw response body) or ``str``.  The
+``*_bs4`` functions are the previous BeautifulSoup implementations, kept
+as the reference for ``bench_extract.py``.
+"""
+
+import json
+import math
+import re
+
+from lxml import etree
+
+_BODY_RE = re.compile(rb"<body[\s>]", re.I)
+_SCRIPT_OPEN_RE = re.compile(rb"<script\b[^>]*>", re.I)
+_SCRIPT_CLOSE_RE = re.compile(rb"</script\s*>", re.I)
+_NEXT_DATA_RE = re.compile(rb"<script\b[^>]*\bid\s*=\s*[\"']?__NEXT_DATA__\b[^>]*>", re.I)
+# Начало объекта объявления в JSON страницы; id — его первый ключ
+_PROPERTY_ID_RE = re.compile(
+    rb'"propertyResult"\s*:\s*\{\s*"property"\s*:\s*\{\s*"id"\s*:\s*(?:"((?:[^"\\]|\\.)*)"|(-?\d+))'
+)
+_SHARE_URL_RE = re.compile(rb'"share_url"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_PRICE_VALUE_RE = re.compile(rb'"price"\s*:\s*\{\s*"value"\s*:\s*(-?[0-9][0-9.eE+-]*|null)')
+
+_HTML_PARSER = etree.HTMLParser(encoding="utf-8", huge_tree=True, no_network=True)
+_LINKS_XPATH = etree.XPath(
+    "(//*[@aria-label='Properties'])[1]//*[@data-testid='property-card-link']/@href"
+)
+
+
+def _as_bytes(html):
+    return html.encode("utf-8") if isinstance(html, str) else html
+
+
+def _script_text(data, open_match):
+    """Raw text of the script whose opening tag is ``open_match``."""
+    start = open_match.end()
+    close = _SCRIPT_CLOSE_RE.search(data, start)
+    return data[start:close.start() if close else len(data)]
+
+
+def extract_links_from_page(html):
+    """Extract property links from search page HTML."""
+    data = _as_bytes(html)
+    if not data or not data.strip():
+        return []
+    doc = etree.fromstring(data, _HTML_PARSER)
+    if doc is None:
+        return []
+    return [str(href) for href in _LINKS_XPATH(doc)]
+
+
+def extract_first_script(html):
+    """Extract JSON data from first script tag in <body>."""
+    data = _as_bytes(html)
+    body = _BODY_RE.search(data)
+    if body is None:
+        return ""
+    script = _SCRIPT_OPEN_RE.search(data, body.end())
+    if script is None:
+        return ""
+    text = _script_text(data, script)
+    idx = text.find(b"{")
+    return text[idx:].decode("utf-8", errors="replace") if idx >= 0 else ""
+
+
+def extract_next_data(html):
+    """Parse the embedded Next.js payload (<script id="__NEXT_DATA__">) of a page."""
+    data = _as_bytes(html)
+    script = _NEXT_DATA_RE.search(data)
+    if script is None:
+        return {}
+    text = _script_text(data, script).strip()
+    return json.loads(text) if text else {}
+
+
+# --- search page payload ---
+
+def search_result(next_data):
+    return (next_data.get("props", {}).get("pageProps", {}).get("searchResult") or {})
+
+
+def search_listings(next_data):
+    """Property objects of the cards embedded in a search page payload."""
+    return [
+        item["property"]
+        for item in search_result(next_data).get("listings") or []
+        if isinstance(item, dict) and isinstance(item.get("property"), dict)
+    ]
+
+
+def search_meta(next_data):
+    """Pagination of a search page: {"page_count": int or None, "total_count": int or None}."""
+    meta = search_result(next_data).get("meta") or {}
+    total = meta.get("total_count")
+    page_count = meta.get("page_count")
+    if not page_count and total and meta.get("per_page"):
+        page_count = math.ceil(total / meta["per_page"])
+    return {"page_count": page_count, "total_count": total}
+
+
+def detail_summary(next_data):
+    """Price and listing date of a property page: {"price": value or None, "listed_date": str or None}."""
+    prop = ((next_data.get("props", {}).get("pageProps", {}).get("propertyResult") or {})
+            .get("property") or {})
+    return {"price": (prop.get("price") or {}).get("value"), "listed_date": prop.get("listed_date")}
+
+
+def property_key(page_json):
+    """(id, share_url, price) of a property page's JSON text, without parsing it.
+
+    Reads the first ``"id"`` of ``propertyResult.property`` and the first
+    ``share_url`` and ``"price": {"value": ...}`` after it; price is the raw
+    number text or None.  Returns None when the payload has another layout
+    (id not the first key), so the caller can fall back to ``json.loads``.
+    """
+    data = _as_bytes(page_json)
+    m = _PROPERTY_ID_RE.search(data)
+    if m is None:
+        return None
+    listing_id = _json_string(m.group(1)) if m.group(1) is not None else m.group(2).decode()
+    url = _SHARE_URL_RE.search(data, m.end())
+    price = _PRICE_VALUE_RE.search(data, m.end())
+    return (listing_id,
+            _json_string(url.group(1)) if url else None,
+            price.group(1).decode() if price and price.group(1) != b"null" else None)
+
+
+def _json_string(raw):
+    return json.loads(b'"' + raw + b'"') if b"\\" in raw else raw.decode("utf-8")
+
+
+def card_prices(next_data):
+    """Map listing id -> card price for the cards of a search page."""
+    prices = {}
+    for prop in search_listings(next_data):
+        if prop.get("id") is not None:
+            prices[str(prop["id"])] = (prop.get("price") or {}).get("value")
+    return prices
+
+
+# --- BeautifulSoup reference implementations ---
+
+def extract_links_from_page_bs4(html):
+    """Extract property links from search page HTML (BeautifulSoup)."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
+    section = soup.select_one("[aria-label='Properties']")
+    if not section:
+        return []
+    return [
+        a["href"]
+        for a in section.select("[data-testid='property-card-link']")
+        if a.has_attr("href")
+    ]
+
+
+def extract_first_script_bs4(html):
+    """Extract JSON data from first script tag (BeautifulSoup)."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
+    script = soup.body.find("script")
+    text = script.string or ""
+    idx = text.find("{")
+    return text[idx:] if idx >= 0 else ""
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Asynchronous HTTP fetch engine shared by the PropertyFinder scrapers.
+
+One ``aiohttp`` session with a keep-alive connection pool is reused for
+every request of a run.  The pool bounds the total number of in-flight
+requests and the number of connections opened to a single host; within
+that bound an AIMD limiter (:class:`AdaptiveLimiter`) picks the actual
+concurrency from observed latency, throttling and timeouts.
+"""
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+from telemetry import CrawlTelemetry
+
+try:
+    import brotli  # noqa: F401  (aiohttp decodes "br" only when it is installed)
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+
+class FetchError(Exception):
+    """HTTP error response (status >= 400)."""
+
+    def __init__(self, url, status, headers=None):
+        super().__init__(f"HTTP {status} for {url}")
+        self.url = url
+        self.status = status
+        self.headers = headers or {}
+
+
+class Response:
+    """Downloaded page: final URL, status, headers and raw body bytes."""
+
+    __slots__ = ("url", "status", "headers", "body")
+
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self):
+        return self.body.decode("utf-8", errors="replace")
+
+
+# Ответы, означающие перегрузку сервера: уменьшаем конкурентность и повторяем
+THROTTLE_STATUSES = {429, 503}
+# Ответы, которые имеет смысл повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 300
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(delay, 0.0), MAX_RETRY_AFTER)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit.
+
+    The limit grows while responses are healthy (no throttling, latency
+    within ``latency_factor`` x the best latency seen): by one per response
+    until the first congestion signal (slow start), then by ``1 / limit``
+    per response (about one per round of requests).  A 429/503 or a timeout
+    multiplies it by ``decrease``, at most once per observed latency so that
+    one burst of errors counts as one signal.  ``Retry-After`` pauses all new
+    requests until the given time.
+    """
+
+    def __init__(self, initial=16, minimum=1, maximum=100,
+                 decrease=0.5, latency_factor=3.0):
+        self.minimum = max(int(minimum), 1)
+        self.maximum = max(int(maximum), self.minimum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.slow_start = True
+        self.min_latency = None
+        self.avg_latency = None
+        self.last_decrease = 0.0
+        self.pause_until = 0.0
+        self.peak = self.limit
+        self.throttled = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.responses = 0
+        self._cond = None
+
+    @property
+    def cond(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self):
+        delay = self.pause_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, outcome, latency=None, retry_after=None):
+        """Return a slot; ``outcome`` is "ok", "throttle", "timeout", "error" or "cancelled"."""
+        async with self.cond:
+            self.in_flight -= 1
+            self._update(outcome, latency, retry_after)
+            self.cond.notify_all()
+
+    def _healthy_latency(self, latency):
+        if latency is None:
+            return True
+        self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+        self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+        return self.avg_latency <= self.min_latency * self.latency_factor
+
+    def _update(self, outcome, latency, retry_after):
+        if outcome == "cancelled":
+            return
+        now = time.monotonic()
+        self.responses += 1
+        if outcome == "ok":
+            if self._healthy_latency(latency):
+                step = 1.0 if self.slow_start else 1.0 / self.limit
+                self.limit = min(self.maximum, self.limit + step)
+                self.peak = max(self.peak, self.limit)
+            return
+        if outcome == "error":
+            self.errors += 1
+            return
+        if outcome == "throttle":
+            self.throttled += 1
+        else:
+            self.timeouts += 1
+        if retry_after:
+            self.pause_until = max(self.pause_until, now + retry_after)
+        if now - self.last_decrease >= (self.avg_latency or 1.0):
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            self.last_decrease = now
+            self.slow_start = False
+
+    def summary(self):
+        return (
+            f"Adaptive concurrency settled at {int(self.limit)} "
+            f"(peak {int(self.peak)}, max {self.maximum}); "
+            f"{self.responses} responses, {self.throttled} throttled, "
+            f"{self.timeouts} timeouts, {self.errors} errors"
+        )
+
+
+def _accept_encoding(headers):
+    """Drop "br" from Accept-Encoding if the brotli decoder is not available."""
+    headers = dict(headers)
+    enc = headers.get("Accept-Encoding")
+    if enc and not HAS_BROTLI:
+        parts = [p.strip() for p in enc.split(",") if p.strip() != "br"]
+        headers["Accept-Encoding"] = ", ".join(parts)
+    return headers
+
+
+class AsyncFetcher:
+    """Shared connection pool with bounded total and per-host concurrency.
+
+    ``concurrency`` is the ceiling of the adaptive limit, which starts at
+    ``start_concurrency``.  Failed requests (network errors, timeouts and
+    RETRY_STATUSES) are retried up to ``retries`` times with jittered
+    exponential backoff or the server's ``Retry-After``.
+
+    With a ``cache`` (http_cache.ResponseCache) fresh entries are served
+    without a request and stale ones are revalidated with a conditional GET.
+    With a ``recorder`` (replay.FixtureRecorder) every final response is
+    saved as a fixture for offline replay.  Every attempt is counted in
+    ``telemetry`` (telemetry.CrawlTelemetry).
+
+    Usage::
+
+        async with AsyncFetcher(headers, cookies, concurrency=100) as fetcher:
+            resp = await fetcher.get(url)
+    """
+
+    def __init__(self, headers=None, cookies=None, concurrency=100,
+                 per_host=50, timeout=30, start_concurrency=16, retries=3, cache=None,
+                 recorder=None, telemetry=None):
+        self.headers = _accept_encoding(headers or {})
+        self.cookies = cookies or {}
+        self.concurrency = max(int(concurrency), 1)
+        self.per_host = max(int(per_host), 1)
+        self.timeout = timeout
+        self.retries = retries
+        self.cache = cache
+        self.recorder = recorder
+        self.telemetry = telemetry or CrawlTelemetry()
+        self.limiter = AdaptiveLimiter(initial=start_concurrency, maximum=self.concurrency)
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.per_host,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            cookies=self.cookies,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def get(self, url, retries=None):
+        """GET ``url`` and return a :class:`Response`.
+
+        Raises :class:`FetchError` for HTTP error statuses, and
+        ``aiohttp.ClientError`` / ``asyncio.TimeoutError`` for network errors,
+        once the retries are exhausted.
+        """
+        if self.recorder is None:
+            return await self._get(url, retries)
+        try:
+            resp = await self._get(url, retries)
+        except FetchError as e:
+            self.recorder.record(url, e.status, e.headers, b"")
+            raise
+        self.recorder.record(url, resp.status, resp.headers, resp.body)
+        return resp
+
+    async def _get(self, url, retries=None):
+        retries = self.retries if retries is None else retries
+        entry = cached_body = None
+        if self.cache is not None:
+            # SQLite, чтение файла и распаковка — в потоке, не в цикле событий
+            entry, cached_body = await asyncio.to_thread(self.cache.load, url)
+            if entry is not None and self.cache.is_fresh(entry):
+                await asyncio.to_thread(self.cache.hit, entry, cached_body)
+                self.telemetry.cache_event("hit", len(cached_body))
+                return Response(url, entry.status, entry.headers, cached_body)
+        conditional = entry.validators() if entry is not None else None
+        for attempt in range(retries + 1):
+            error = None
+            retry_after = None
+            outcome = "error"
+            latency = None
+            await self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                async with self.session.get(url, headers=conditional) as r:
+                    body = await r.read()
+                latency = time.monotonic() - start
+                self.telemetry.request(r.status, latency, len(body))
+                if r.status in THROTTLE_STATUSES:
+                    outcome = "throttle"
+                    retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                elif r.status < 500:
+                    outcome = "ok"
+                if r.status >= 400:
+                    error = FetchError(url, r.status, dict(r.headers))
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            except asyncio.TimeoutError as e:
+                outcome = "timeout"
+                error = e
+                self.telemetry.request("timeout")
+            except aiohttp.ClientError as e:
+                error = e
+                self.telemetry.request("network_error")
+            finally:
+                await self.limiter.release(outcome, latency, retry_after)
+
+            if error is None:
+                if r.status == 304 and entry is not None:
+                    await asyncio.to_thread(self.cache.hit, entry, cached_body, True)
+                    self.telemetry.cache_event("revalidated", len(cached_body))
+                    return Response(str(r.url), entry.status, entry.headers, cached_body)
+                if self.cache is not None and r.status == 200:
+                    await asyncio.to_thread(self.cache.store, url, r.status, r.headers, body)
+                return Response(str(r.url), r.status, dict(r.headers), body)
+            retryable = not isinstance(error, FetchError) or error.status in RETRY_STATUSES
+            if not retryable or attempt == retries:
+                raise error
+            self.telemetry.retry()
+            delay = retry_after if retry_after is not None else 2 ** attempt
+            await asyncio.sleep(delay * random.uniform(1.0, 1.5))
+
+
+    def latency_summary(self):
+        """p50 / p99 latency of the responses received so far."""
+        return self.telemetry.latency_summary()
+
+
+def run(coro, threads=None):
+    """Run ``coro`` in a new event loop.
+
+    Blocking work (HTML parsing, file writes) is pushed to the loop's
+    default executor with ``asyncio.to_thread``; ``threads`` sizes it.
+    """
+    async def _main():
+        if threads:
+            from concurrent.futures import ThreadPoolExecutor
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=threads)
+            )
+        return await coro
+
+    return asyncio.run(_main())
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Declarative mapping of raw PropertyFinder property objects to output records.
+
+``FIELDS`` lists every output field with its source path in the property
+object and an optional converter.  Each field is turned once, at import,
+into a getter (:func:`field_getter`); :func:`transform_property` detects
+the input layout and applies the getters in order:
+
+* a property page payload (``props.pageProps.propertyResult.property``,
+  the files in json_data/ and NDJSON shards);
+* a bare property object at the root (search page cards, old exports).
+
+:func:`transform_property` is used by take_all.py and a.py.
+``python bench_transform.py`` compares it with the hand-written transform
+it replaced.
+"""
+
+from operator import methodcaller
+
+# Путь к объекту объявления в данных страницы Next.js
+PAGE_LAYOUT = ("props", "pageProps", "propertyResult", "property")
+
+_EMPTY = {}
+
+
+class Field:
+    """Output field ``name`` = ``convert(value at path)``.
+
+    ``path`` is a dotted path ("location.full_name"), a tuple of paths of
+    which the first truthy value is taken, or a dict of output key -> path
+    for a nested object.  ``default`` (a literal) is used when the last key
+    of the path is missing.
+    """
+
+    __slots__ = ("name", "paths", "convert", "default")
+
+    def __init__(self, name, path, convert=None, default=None):
+        self.name = name
+        if isinstance(path, dict):
+            self.paths = {key: p.split(".") for key, p in path.items()}
+        else:
+            self.paths = tuple(p.split(".") for p in ((path,) if isinstance(path, str) else path))
+        self.convert = convert
+        self.default = default
+
+
+# --- converters ---
+
+def phone_number(contact_options):
+    """Value of the first "phone" contact option."""
+    for contact in contact_options or ():
+        if isinstance(contact, dict) and contact.get("type") == "phone":
+            return contact.get("value")
+    return None
+
+
+def rent_or_sell(is_rent):
+    return "rent" if is_rent else "sell"
+
+
+def size_text(size):
+    """"<value> <unit>" if both are set."""
+    if not isinstance(size, dict):
+        return None
+    value, unit = size.get("value"), size.get("unit")
+    return f"{value} {unit}" if value and unit else None
+
+
+def upper(value):
+    return value.upper() if isinstance(value, str) else value
+
+
+def each(key):
+    """Converter: the truthy ``key`` values of a list of objects."""
+    def pluck(items):
+        try:
+            return [value for item in items or () if (value := item.get(key))]
+        except AttributeError:
+            return [item[key] for item in items if isinstance(item, dict) and item.get(key)]
+    pluck.__name__ = f"each_{key}"
+    return pluck
+
+
+FIELDS = (
+    Field("id", "id"),
+    Field("url", "share_url"),
+    Field("title", "title"),
+    Field("displayAddress", "location.full_name"),
+    Field("bedrooms", "bedrooms"),
+    Field("bathrooms", "bathrooms"),
+    Field("addedOn", "listed_date"),
+    Field("broker", "broker.name"),
+    Field("agent", "agent.name"),
+    Field("agentInfo", "agent", default={}),
+    Field("agentPhone", "contact_options", phone_number),
+    Field("verified", "is_verified"),
+    Field("reference", "reference"),
+    Field("brokerLicenseNumber", "broker.license_number"),
+    Field("brokerInfo", "broker", default={}),
+    Field("priceDuration", "isRent", rent_or_sell),
+    Field("propertyType", "property_type"),
+    Field("price", "price.value"),
+    Field("rera", "rera.number"),
+    Field("priceCurrency", "price.currency"),
+    Field("coordinates", {"latitude": "location.coordinates.lat",
+                          "longitude": "location.coordinates.lon"}),
+    Field("type", "offering_type"),
+    Field("sizeMin", "size", size_text),
+    Field("furnishing", "furnished", upper, default="NO"),
+    Field("features", "amenities", each("name")),
+    Field("description", "description"),
+    Field("descriptionHTML", ("descriptionHTML", "description")),
+    Field("images", "images.property", each("full")),
+    Field("similarTransactions", "similar_price_transactions"),
+    Field("reraPermitUrl", "rera.permit_validation_url"),
+)
+
+
+def path_getter(path, default=None):
+    """``func(prop)``: value at ``path`` (a list of keys), or ``default``.
+
+    A missing or non-object step on the way gives ``default`` too.
+    """
+    *parents, key = path
+    if not parents:
+        return methodcaller("get", key, default)
+
+    def get(prop):
+        for parent in parents:
+            prop = prop.get(parent)
+            if type(prop) is not dict:
+                return default
+        return prop.get(key, default)
+    return get
+
+
+def field_getter(field):
+    """``func(prop)`` giving the output value of ``field``."""
+    if isinstance(field.paths, dict):
+        nested = tuple((key, path_getter(path, field.default)) for key, path in field.paths.items())
+
+        def get(prop):
+            return {key: get_value(prop) for key, get_value in nested}
+    elif len(field.paths) == 1:
+        get = path_getter(field.paths[0], field.default)
+    else:
+        getters = tuple(path_getter(path, field.default) for path in field.paths)
+
+        def get(prop):
+            for get_value in getters:
+                value = get_value(prop)
+                if value:
+                    break
+            return value
+    if field.convert is None:
+        return get
+    convert = field.convert
+    return lambda prop: convert(get(prop))
+
+
+# Геттеры полей строятся один раз при импорте
+_GETTERS = tuple((field.name, field_getter(field)) for field in FIELDS)
+
+
+def transform_property(data):
+    """Transform a raw property object into the output record (see FIELDS).
+
+    ``data`` is either a page payload whose property object is at
+    PAGE_LAYOUT (detected by its first key) or the property object itself.
+    """
+    if PAGE_LAYOUT[0] in data:
+        prop = data
+        for key in PAGE_LAYOUT:
+            prop = prop.get(key) if type(prop) is dict else None
+        if type(prop) is not dict:
+            prop = _EMPTY
+    else:
+        prop = data
+    return {name: get(prop) for name, get in _GETTERS}
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""On-disk HTTP response cache for the scraper (``a.py --cache-dir``).
+
+Bodies are content-addressed: stored gzip-compressed under
+``bodies/<sha256[:2]>/<sha256>.gz``, so identical pages are kept once.
+``cache.sqlite`` maps each URL to its body hash, status, ``ETag``,
+``Last-Modified``, fetch time and last use.
+
+* an entry younger than ``ttl`` seconds is served without a request;
+* an older one is revalidated with ``If-None-Match`` / ``If-Modified-Since``,
+  and a 304 answer is served from disk;
+* when the bodies exceed ``max_bytes`` the least recently used entries
+  are evicted.
+
+Hit rate and bytes saved are counted per run (:meth:`ResponseCache.summary`).
+
+The cache is called from worker threads (``asyncio.to_thread`` in
+fetcher.AsyncFetcher), never on the event loop: SQLite access is
+serialized by a lock, hashing, compression and file I/O run outside it,
+and writes are committed in batches of ``COMMIT_EVERY`` or every
+``COMMIT_INTERVAL`` seconds.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# Заголовки ответа, которые сохраняются вместе с телом
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+# Запись в SQLite фиксируется пачками: не чаще раза на COMMIT_EVERY изменений или секунду
+COMMIT_EVERY = 200
+COMMIT_INTERVAL = 1.0
+
+
+class CachedResponse:
+    """Cache entry: body hash, status, validators and timestamps."""
+
+    __slots__ = ("url", "body_hash", "status", "headers", "etag", "last_modified", "fetched_at")
+
+    def __init__(self, url, body_hash, status, headers, etag, last_modified, fetched_at):
+        self.url = url
+        self.body_hash = body_hash
+        self.status = status
+        self.headers = headers
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def validators(self):
+        """Conditional request headers for revalidation."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """Content-addressed response cache with TTL, revalidation and LRU eviction."""
+
+    def __init__(self, directory, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, "cache.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.lock = threading.Lock()
+        self.uncommitted = 0
+        self.committed_at = time.monotonic()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " url TEXT PRIMARY KEY, body_hash TEXT NOT NULL, status INTEGER,"
+            " headers TEXT, etag TEXT, last_modified TEXT,"
+            " fetched_at REAL, last_used REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_body ON entries (body_hash)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, size INTEGER, raw_size INTEGER)"
+        )
+        self.conn.commit()
+        self.total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM bodies"
+        ).fetchone()[0]
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evicted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.directory, "bodies", body_hash[:2], body_hash + ".gz")
+
+    def _wrote(self, force=False):
+        """Count a change and commit the batch when it is due (lock held)."""
+        self.uncommitted += 1
+        now = time.monotonic()
+        if force or self.uncommitted >= COMMIT_EVERY or now - self.committed_at >= COMMIT_INTERVAL:
+            self.conn.commit()
+            self.uncommitted = 0
+            self.committed_at = now
+
+    def lookup(self, url):
+        """Cached entry for ``url`` or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body_hash, status, headers, etag, last_modified, fetched_at"
+                " FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        body_hash, status, headers, etag, last_modified, fetched_at = row
+        return CachedResponse(url, body_hash, status, json.loads(headers or "{}"),
+                              etag, last_modified, fetched_at)
+
+    def is_fresh(self, entry):
+        return self.ttl > 0 and time.time() - entry.fetched_at < self.ttl
+
+    def read_body(self, entry):
+        """Body of a cached entry, or None if its file is gone."""
+        try:
+            with open(self._body_path(entry.body_hash), "rb") as f:
+                return gzip.decompress(f.read())
+        except (OSError, EOFError):
+            return None
+
+    def load(self, url):
+        """(entry, body) for ``url``, or (None, None) if not cached or the body is gone."""
+        entry = self.lookup(url)
+        body = self.read_body(entry) if entry is not None else None
+        if body is None:
+            return None, None
+        return entry, body
+
+    def hit(self, entry, body, revalidated=False):
+        """Count a response served from the cache and bump its LRU position."""
+        now = time.time()
+        with self.lock:
+            if revalidated:
+                self.revalidated += 1
+                self.conn.execute("UPDATE entries SET fetched_at = ?, last_used = ? WHERE url = ?",
+                                  (now, now, entry.url))
+            else:
+                self.hits += 1
+                self.conn.execute("UPDATE entries SET last_used = ? WHERE url = ?", (now, entry.url))
+            self.bytes_saved += len(body)
+            self._wrote()
+
+    def store(self, url, status, headers, body):
+        """Store a downloaded response (counted as a miss)."""
+        body_hash = hashlib.sha256(body).hexdigest()
+        with self.lock:
+            self.misses += 1
+            known = self.conn.execute("SELECT 1 FROM bodies WHERE hash = ?",
+                                      (body_hash,)).fetchone() is not None
+        data = None
+        if not known:
+            # Сжатие и запись файла — без блокировки; имя .tmp своё у каждого потока
+            path = self._body_path(body_hash)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = gzip.compress(body, compresslevel=6, mtime=0)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        kept = {k: headers[k] for k in KEPT_HEADERS if k in headers}
+        now = time.time()
+        with self.lock:
+            if data is not None:
+                cur = self.conn.execute(
+                    "INSERT OR IGNORE INTO bodies (hash, size, raw_size) VALUES (?, ?, ?)",
+                    (body_hash, len(data), len(body)),
+                )
+                if cur.rowcount:
+                    self.total_bytes += len(data)
+            old = self.conn.execute("SELECT body_hash FROM entries WHERE url = ?", (url,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries"
+                " (url, body_hash, status, headers, etag, last_modified, fetched_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, body_hash, status, json.dumps(kept), headers.get("ETag"),
+                 headers.get("Last-Modified"), now, now),
+            )
+            if old and old[0] != body_hash:
+                self._drop_unreferenced(old[0])
+            self._wrote()
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _drop_unreferenced(self, body_hash):
+        if self.conn.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1",
+                             (body_hash,)).fetchone():
+            return
+        row = self.conn.execute("SELECT size FROM bodies WHERE hash = ?", (body_hash,)).fetchone()
+        self.conn.execute("DELETE FROM bodies WHERE hash = ?", (body_hash,))
+        if row:
+            self.total_bytes -= row[0]
+        try:
+            os.remove(self._body_path(body_hash))
+        except OSError:
+            pass
+
+    def evict(self, target=None):
+        """Drop least recently used entries until the bodies fit ``target`` bytes.
+
+        The default target is 90% of ``max_bytes`` so that eviction does not
+        run again on the very next store.
+        """
+        with self.lock:
+            self._evict(target)
+
+    def _evict(self, target=None):
+        target = int(self.max_bytes * 0.9) if target is None else target
+        rows = self.conn.execute("SELECT url, body_hash FROM entries ORDER BY last_used")
+        for url, body_hash in rows.fetchall():
+            if self.total_bytes <= target:
+                break
+            self.conn.execute("DELETE FROM entries WHERE url = ?", (url,))
+            self._drop_unreferenced(body_hash)
+            self.evicted += 1
+        self._wrote(force=True)
+
+    def summary(self):
+        served = self.hits + self.revalidated
+        requests = served + self.misses
+        rate = 100.0 * served / requests if requests else 0.0
+        return (
+            f"HTTP cache: {rate:.1f}% hit rate ({self.hits} fresh, {self.revalidated} revalidated, "
+            f"{self.misses} downloaded), {self.bytes_saved / 1024 / 1024:.1f} MB saved, "
+            f"{self.evicted} evicted, {self.total_bytes / 1024 / 1024:.1f} MB on disk"
+        )
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Durable journal of a crawl, stored as ``journal.sqlite`` in the scrape dir.
+
+Every completed search page (with the links and card prices it yielded)
+and every saved property page is committed as soon as it finishes, so
+``a.py --resume <scrape_dir>`` can continue an interrupted run without
+refetching finished work.
+
+Property pages that fail are quarantined in ``failures`` with their cause;
+they are retried at the end of the run and can be replayed later with
+``a.py --retry-failed <scrape_dir>``.
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+JOURNAL_FILE = "journal.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    category TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    links INTEGER NOT NULL,
+    done_at REAL NOT NULL,
+    PRIMARY KEY (category, page)
+);
+CREATE TABLE IF NOT EXISTS links (
+    category TEXT NOT NULL,
+    url TEXT NOT NULL,
+    listing_id TEXT,
+    price REAL,
+    PRIMARY KEY (category, url)
+);
+CREATE TABLE IF NOT EXISTS details (
+    url TEXT PRIMARY KEY,
+    done_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failures (
+    url TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    listing_id TEXT,
+    price REAL,
+    cause TEXT,
+    status INTEGER,
+    attempts INTEGER NOT NULL,
+    first_failed REAL NOT NULL,
+    last_failed REAL NOT NULL
+);
+"""
+
+# Ответы, после которых повтор бессмысленен (объявление снято)
+PERMANENT_STATUSES = (404, 410)
+
+
+class CrawlJournal:
+    """Append-only record of finished search pages and property pages."""
+
+    def __init__(self, scrape_dir):
+        self.path = os.path.join(scrape_dir, JOURNAL_FILE)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    @classmethod
+    def exists(cls, scrape_dir):
+        return os.path.isfile(os.path.join(scrape_dir, JOURNAL_FILE))
+
+    # --- run parameters ---
+
+    def set_meta(self, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value))
+        )
+        self.conn.commit()
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    # --- phase 1: search pages ---
+
+    def page_done(self, category, page, links, prices=None, listing_id=None):
+        """Record a finished search page and the links (and card prices) it yielded."""
+        prices = prices or {}
+        rows = []
+        for url in links:
+            pid = listing_id(url) if listing_id else None
+            rows.append((category, url, pid, prices.get(pid)))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO links (category, url, listing_id, price) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (category, page, links, done_at) VALUES (?, ?, ?, ?)",
+                (category, page, len(links), time.time()),
+            )
+
+    def done_pages(self, category):
+        return {
+            row[0] for row in
+            self.conn.execute("SELECT page FROM pages WHERE category = ?", (category,))
+        }
+
+    def iter_links(self, category):
+        """(url, listing id, card price) of the journaled links of a category, streamed."""
+        return self.conn.execute(
+            "SELECT url, listing_id, price FROM links WHERE category = ?", (category,)
+        )
+
+    # --- phase 2: property pages ---
+
+    def detail_done(self, url):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO details (url, done_at) VALUES (?, ?)", (url, time.time())
+            )
+            self.conn.execute("DELETE FROM failures WHERE url = ?", (url,))
+
+    def detail_failed(self, category, url, cause, status=None, listing_id=None, price=None):
+        """Quarantine a property page that could not be saved (attempts are counted)."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO failures (url, category, listing_id, price, cause, status,"
+                " attempts, first_failed, last_failed) VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)"
+                " ON CONFLICT (url) DO UPDATE SET cause = excluded.cause,"
+                " status = excluded.status, attempts = attempts + 1,"
+                " last_failed = excluded.last_failed",
+                (url, category, listing_id, price, cause, status, now, now),
+            )
+
+    def failed_details(self, retryable_only=False):
+        """Quarantined pages: (category, url, listing id, price, cause, status, attempts).
+
+        ``retryable_only`` leaves out pages that answered PERMANENT_STATUSES.
+        """
+        query = ("SELECT category, url, listing_id, price, cause, status, attempts"
+                 " FROM failures")
+        if retryable_only:
+            marks = ", ".join("?" * len(PERMANENT_STATUSES))
+            query += f" WHERE status IS NULL OR status NOT IN ({marks})"
+            return self.conn.execute(query + " ORDER BY first_failed", PERMANENT_STATUSES).fetchall()
+        return self.conn.execute(query + " ORDER BY first_failed").fetchall()
+
+    def is_detail_done(self, url):
+        return self.conn.execute("SELECT 1 FROM details WHERE url = ?", (url,)).fetchone() is not None
+
+    def close(self):
+        self.conn.close()
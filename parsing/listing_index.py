@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Persistent index of scraped listings: property id -> last price / last seen.
+
+Used by ``a.py --incremental`` to skip detail pages of listings whose
+search card price has not changed since the previous run, and by
+``a.py --recrawl`` (see recrawl.py), which schedules refetches from the
+price-change history and listing date kept here.  The index is a
+small SQLite file shared by all runs (and by the rent and sale categories);
+it can be seeded from transformed JSON output or from the Django
+``Property`` table (``manage.py export_listing_index``).
+"""
+
+import json
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+try:
+    from shards import is_ndjson, iter_ndjson_records
+except ImportError:  # импорт как parsing.listing_index (manage.py export_listing_index)
+    from parsing.shards import is_ndjson, iter_ndjson_records
+
+LISTING_ID_RE = re.compile(r"-(\d+)\.html?$")
+# Записей за одну транзакцию при заполнении из NDJSON
+SEED_BATCH = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    id TEXT PRIMARY KEY,
+    price REAL,
+    url TEXT,
+    first_seen REAL,
+    last_seen REAL
+)
+"""
+# Колонки, добавленные позже: история цены и даты для планировщика (recrawl.py)
+COLUMNS = {
+    "last_fetched": "REAL",
+    "listed_at": "REAL",
+    "price_changes": "INTEGER NOT NULL DEFAULT 0",
+    "last_changed": "REAL",
+}
+
+
+def listing_id_from_url(url):
+    """PropertyFinder listing id from a detail URL ("...-12345678.html")."""
+    m = LISTING_ID_RE.search(urlparse(url).path)
+    return m.group(1) if m else None
+
+
+def normalize_price(value):
+    """Price as float, or None if it is missing or not numeric."""
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_timestamp(value):
+    """Unix time from a number or an ISO date ("2024-01-01T10:00:00Z"), or None."""
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class ListingIndex:
+    """SQLite-backed id -> (price, last_seen) map."""
+
+    def __init__(self, path):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(SCHEMA)
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(listings)")}
+        for name, decl in COLUMNS.items():
+            if name not in existing:
+                self.conn.execute(f"ALTER TABLE listings ADD COLUMN {name} {decl}")
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    def get(self, listing_id):
+        """Return (price, last_seen) for a listing, or None if it is unknown."""
+        return self.conn.execute(
+            "SELECT price, last_seen FROM listings WHERE id = ?", (str(listing_id),)
+        ).fetchone()
+
+    def is_changed(self, listing_id, price):
+        """True if the listing is new or its price differs from the indexed one."""
+        row = self.get(listing_id)
+        if row is None or row[0] is None:
+            return True
+        price = normalize_price(price)
+        return price is None or price != row[0]
+
+    def record(self, rows, ts=None):
+        """Upsert (id, price, url[, seen_ts[, listed_at]]) rows as seen and fetched at ``ts``.
+
+        A price that differs from the indexed one counts as a price change;
+        a missing price keeps the indexed one.
+        """
+        ts = ts or time.time()
+        rows = [
+            (str(row[0]), normalize_price(row[1]), row[2],
+             row[3] if len(row) > 3 and row[3] else ts,
+             normalize_timestamp(row[4]) if len(row) > 4 else None)
+            for row in rows
+        ]
+        changed = ("excluded.price IS NOT NULL AND listings.price IS NOT NULL "
+                   "AND excluded.price != listings.price")
+        self.conn.executemany(
+            "INSERT INTO listings (id, price, url, first_seen, last_seen, last_fetched, listed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT(id) DO UPDATE SET price_changes = listings.price_changes + ({changed}), "
+            f"last_changed = CASE WHEN {changed} THEN excluded.last_seen "
+            "ELSE listings.last_changed END, "
+            "price = COALESCE(excluded.price, listings.price), "
+            "url = COALESCE(excluded.url, listings.url), last_seen = excluded.last_seen, "
+            "last_fetched = excluded.last_fetched, "
+            "listed_at = COALESCE(excluded.listed_at, listings.listed_at)",
+            [(pid, price, url, seen, seen, seen, listed) for pid, price, url, seen, listed in rows],
+        )
+        self.conn.commit()
+
+    def touch(self, ids, ts=None):
+        """Mark already indexed listings as seen at ``ts`` without changing the price."""
+        ts = ts or time.time()
+        self.conn.executemany(
+            "UPDATE listings SET last_seen = ? WHERE id = ?",
+            [(ts, str(pid)) for pid in ids],
+        )
+        self.conn.commit()
+
+    def remove(self, ids):
+        """Drop listings that no longer exist (404 / 410)."""
+        self.conn.executemany("DELETE FROM listings WHERE id = ?", [(str(pid),) for pid in ids])
+        self.conn.commit()
+
+    def schedule_rows(self):
+        """Cursor of (id, url, price_changes, first_seen, last_fetched, last_changed, listed_at)."""
+        return self.conn.execute(
+            "SELECT id, url, price_changes, first_seen, last_fetched, last_changed, listed_at "
+            "FROM listings WHERE url IS NOT NULL"
+        )
+
+    def seed_from_json(self, path):
+        """Seed from transformed output (records with id/price/url).
+
+        ``path`` may be a file (JSON array or NDJSON, see transform_pool) or a
+        directory searched for properties.json / properties.ndjson[.gz|.zst]
+        and processed_*.json.  Returns the number of records loaded.
+        """
+        files = [path]
+        if os.path.isdir(path):
+            files = [
+                os.path.join(dirpath, fn)
+                for dirpath, _, names in os.walk(path)
+                for fn in names
+                if fn == "properties.json" or (fn.startswith("properties.") and is_ndjson(fn))
+                or (fn.startswith("processed_") and fn.endswith(".json"))
+            ]
+        count = 0
+        for fn in sorted(files):
+            if is_ndjson(fn):
+                data = iter_ndjson_records(fn)
+            else:
+                with open(fn, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if not isinstance(data, list):
+                    continue
+            ts = os.path.getmtime(fn)
+            rows = []
+            for item in data:
+                if isinstance(item, dict) and item.get("id"):
+                    rows.append((item["id"], item.get("price"), item.get("url"), None,
+                                 item.get("addedOn")))
+                    if len(rows) >= SEED_BATCH:
+                        self.record(rows, ts=ts)
+                        count += len(rows)
+                        rows = []
+            self.record(rows, ts=ts)
+            count += len(rows)
+        return count
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Partitioning of the search space into slices that fit the page cap.
+
+The portal shows a limited number of pages per search, so one search URL
+cannot enumerate a large category.  A :class:`Slice` narrows the search by
+bedrooms, then price band, then area; a slice with more pages than the cap
+is split (:meth:`Slice.split`) until every slice fits.  Bands are disjoint
+integer ranges, so a listing belongs to exactly one leaf slice, except
+that a listing without a bedroom count is in no bedrooms slice:
+:func:`split_coverage` tells from the children's totals whether a split
+lost listings or was not applied by the site at all.  Splitting also
+stops at ``MAX_SPLIT_DEPTH`` levels and ``MAX_SLICES`` slices.
+"""
+
+from urllib.parse import urlencode
+
+# Параметры фильтров поиска PropertyFinder
+PRICE_MIN_PARAM = "pf"
+PRICE_MAX_PARAM = "pt"
+BEDROOMS_PARAM = "bdr[]"
+AREA_MIN_PARAM = "af"
+AREA_MAX_PARAM = "at"
+
+# Первая граница открытого сверху диапазона цены (AED) и площади (sqft)
+PRICE_PIVOT = {"rent": 100000, "sale": 2000000}
+AREA_PIVOT = 1000
+# Узкие диапазоны дальше не делятся
+MIN_PRICE_BAND = 1000
+MIN_AREA_BAND = 50
+# 0 = студия, 7 = 7 и более спален
+BEDROOMS = tuple(range(8))
+# Предел деления: глубже / больше срезов на категорию срез считается неделимым
+MAX_SPLIT_DEPTH = 24
+MAX_SLICES = 2000
+# Столько делений подряд без уменьшения числа объявлений — сайт не применяет фильтр
+MAX_STALLED_SPLITS = 3
+
+
+class Slice:
+    """One search filter: price band, bedrooms, area band (None = unbounded)."""
+
+    __slots__ = ("category", "price", "bedrooms", "area")
+
+    def __init__(self, category, price=(0, None), bedrooms=None, area=(0, None)):
+        self.category = category
+        self.price = price
+        self.bedrooms = bedrooms
+        self.area = area
+
+    def to_dict(self):
+        return {"category": self.category, "price": list(self.price),
+                "bedrooms": self.bedrooms, "area": list(self.area)}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["category"], tuple(d["price"]), d["bedrooms"], tuple(d["area"]))
+
+    def params(self):
+        params = []
+        lo, hi = self.price
+        if lo:
+            params.append((PRICE_MIN_PARAM, lo))
+        if hi is not None:
+            params.append((PRICE_MAX_PARAM, hi))
+        if self.bedrooms is not None:
+            params.append((BEDROOMS_PARAM, self.bedrooms))
+        lo, hi = self.area
+        if lo:
+            params.append((AREA_MIN_PARAM, lo))
+        if hi is not None:
+            params.append((AREA_MAX_PARAM, hi))
+        return params
+
+    def url(self, base_url):
+        params = self.params()
+        if not params:
+            return base_url
+        sep = "&" if "?" in base_url else "?"
+        return f"{base_url}{sep}{urlencode(params)}"
+
+    def __str__(self):
+        def band(lo, hi):
+            return f"{lo}-{'' if hi is None else hi}"
+        parts = [f"price {band(*self.price)}"]
+        if self.bedrooms is not None:
+            parts.append(f"bedrooms {self.bedrooms}")
+        if self.area != (0, None):
+            parts.append(f"area {band(*self.area)}")
+        return f"{self.category} " + ", ".join(parts)
+
+    def splits(self, by_bedrooms=True):
+        """Candidate splits into narrower slices, in order of preference.
+
+        Bedrooms come first: one level of 8 slices narrows a category more
+        than several levels of price bisection.  ``by_bedrooms`` False
+        skips it (e.g. after it lost listings without a bedroom count).
+        """
+        if by_bedrooms and self.bedrooms is None:
+            yield [Slice(self.category, self.price, n, self.area) for n in BEDROOMS]
+        halves = _bisect(self.price, PRICE_PIVOT.get(self.category, 100000), MIN_PRICE_BAND)
+        if halves:
+            yield [Slice(self.category, band, self.bedrooms, self.area) for band in halves]
+        halves = _bisect(self.area, AREA_PIVOT, MIN_AREA_BAND)
+        if halves:
+            yield [Slice(self.category, self.price, self.bedrooms, band) for band in halves]
+
+    def split(self, by_bedrooms=True):
+        """Narrower slices covering this one (the first of :meth:`splits`), or [] if none."""
+        return next(self.splits(by_bedrooms), [])
+
+
+def split_coverage(total, child_totals):
+    """How the children of a split cover their parent's ``total`` listings.
+
+    "ignored": their totals overlap (some child is as large as the parent
+    and the sum exceeds it), so the site did not apply the filter and
+    splitting further is pointless; "short": listings fell out (no
+    bedroom count); "ok" otherwise, or when a total is unknown.
+    """
+    if total is None or any(t is None for t in child_totals):
+        return "ok"
+    child_total = sum(child_totals)
+    if child_total > total and max(child_totals) >= total:
+        return "ignored"
+    if child_total < total:
+        return "short"
+    return "ok"
+
+
+def _bisect(band, pivot, min_band):
+    """Split an inclusive integer band [lo, hi] (hi None = open) in two disjoint bands."""
+    lo, hi = band
+    if hi is None:
+        mid = max(pivot, lo * 4)
+        return [(lo, mid), (mid + 1, None)]
+    if hi - lo < min_band:
+        return []
+    mid = (lo + hi) // 2
+    return [(lo, mid), (mid + 1, hi)]
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Hand-off of downloaded pages from the network side to CPU workers.
+
+Network coroutines only download; the raw body is handed to a process
+pool that does the extraction and the JSON writing, so parsing never
+competes with the event loop for the GIL and all cores stay busy.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class ParsePool:
+    """Process pool behind a bounded hand-off.
+
+    A page takes a slot (``async with pool.slot()``) before it is fetched
+    and keeps it until its worker is done, so at most ``queue_size`` bodies
+    are in flight or waiting to be parsed.  When the workers fall behind the
+    slots fill up and the network side stops issuing new requests.
+
+    ``workers=0`` parses in the event loop's default thread executor.
+    """
+
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = (os.cpu_count() or 1) if workers is None else max(int(workers), 0)
+        self.queue_size = queue_size or max(2 * self.workers, 4)
+        self.executor = ProcessPoolExecutor(self.workers) if self.workers else None
+        self._slots = None
+        self.broken = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def slot(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_size)
+        return self._slots
+
+    async def run(self, func, *args):
+        """Run ``func(*args)`` in a worker; ``func`` must be a module-level function.
+
+        If a worker process dies the pool is unusable: ``broken`` is set.
+        """
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        except BrokenProcessPool:
+            self.broken = True
+            raise
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
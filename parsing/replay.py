@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Recorded responses (fixtures) for offline replay.
+
+``a.py --record DIR`` saves every search and detail response it gets into
+DIR: the body gzip-compressed as ``<sha1 of key>.html.gz`` and one line per
+response in ``index.jsonl``.  ``standin_server.py`` serves them back.
+
+Responses are keyed by path and query with the query parameters sorted
+(:func:`fixture_key`), so the host they were recorded from does not matter.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+INDEX_FILE = "index.jsonl"
+# Ответы, которые имеет смысл записывать: всё, кроме временных ошибок
+SKIP_STATUSES = {429, 500, 502, 503, 504}
+
+
+def fixture_key(url):
+    """Host-independent key of a URL: "/path?sorted=query"."""
+    parsed = urlparse(url)
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return f"{parsed.path or '/'}?{query}" if query else (parsed.path or "/")
+
+
+class FixtureRecorder:
+    """Appends responses to a fixture directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.index = open(os.path.join(directory, INDEX_FILE), "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.recorded = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, url, status, headers, body):
+        if status in SKIP_STATUSES:
+            return
+        key = fixture_key(url)
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".html.gz"
+        with open(os.path.join(self.directory, name), "wb") as f:
+            f.write(gzip.compress(body or b"", compresslevel=6, mtime=0))
+        entry = {
+            "key": key,
+            "url": url,
+            "status": status,
+            "content_type": (headers or {}).get("Content-Type", "text/html"),
+            "file": name,
+        }
+        with self.lock:
+            self.index.write(json.dumps(entry) + "\n")
+            self.index.flush()
+            self.recorded += 1
+
+    def close(self):
+        self.index.close()
+
+
+def load_fixtures(directory):
+    """Map fixture key -> index entry (the last recording of a key wins)."""
+    fixtures = {}
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return fixtures
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                fixtures[entry["key"]] = entry
+    return fixtures
+
+
+def read_fixture(directory, entry):
+    with open(os.path.join(directory, entry["file"]), "rb") as f:
+        return gzip.decompress(f.read())
@@ -59,7 +59,7 @@ if [ -f "$REQUIREMENTS_FILE" ]; then
 else
     log_warning "Файл $REQUIREMENTS_FILE не найден. Устанавливаем базовые зависимости..."
     pip install --upgrade pip
-    pip install requests beautifulsoup4 lxml
+    pip install aiohttp beautifulsoup4 lxml
 fi
 
 # Создаем директорию для результатов, если её нет
@@ -68,20 +68,10 @@ mkdir -p "$SCRAPED_DATA_DIR"
 # Запоминаем текущие папки в scraped_data
 EXISTING_DIRS=$(find "$SCRAPED_DATA_DIR" -maxdepth 1 -type d -name "scrape_*" 2>/dev/null || echo "")
 
-# 3. Запускаем a_buy.py
-log "Запускаем скрипт a_buy.py..."
-if [ -f "a_buy.py" ]; then
-    python a_buy.py
-    log "Скрипт a_buy.py выполнен успешно"
-else
-    log_error "Файл a_buy.py не найден!"
-    exit 1
-fi
-
-# 4. Запускаем a.py
-log "Запускаем скрипт a.py..."
+# 3. Запускаем единый парсер: продажа и аренда в одном процессе с общим пулом соединений
+log "Запускаем a.py (категории: sale, rent)..."
 if [ -f "a.py" ]; then
-    python a.py
+    python a.py --category sale --category rent
     log "Скрипт a.py выполнен успешно"
 else
     log_error "Файл a.py не найден!"
@@ -106,44 +96,47 @@ if [ -z "$CREATED_DIRS" ]; then
     CREATED_DIRS="$NEW_DIRS"
 fi
 
-# 6. Для каждой созданной папки запускаем take_all.py
+# 6. Для каждой категории (rent_listings, sale_listings) каждой созданной папки запускаем take_all.py
 for dir in $CREATED_DIRS; do
-    if [ -d "$dir" ]; then
-        log "Обрабатываем папку: $dir"
+    for cat_dir in "$dir"/*_listings; do
+    if [ -d "$cat_dir" ]; then
+        log "Обрабатываем папку: $cat_dir"
         
         # Запускаем take_all.py для этой папки
         if [ -f "take_all.py" ]; then
             # Определяем имя выходного файла
             dir_name=$(basename "$dir")
-            output_file="${dir}/processed_${dir_name}.json"
+            cat_name=$(basename "$cat_dir")
+            output_file="${cat_dir}/processed_${dir_name}_${cat_name}.json"
             
-            log "Запускаем take_all.py для $dir..."
-            python take_all.py "$dir" "$output_file"
+            log "Запускаем take_all.py для $cat_dir..."
+            python take_all.py -i "$cat_dir" -o "$output_file" -w "$(nproc)"
             
             if [ $? -eq 0 ]; then
-                log "take_all.py выполнен успешно для $dir"
+                log "take_all.py выполнен успешно для $cat_dir"
                 
                 # 7. Удаляем все файлы кроме созданных take_all.py
-                log "Очищаем папку $dir от временных файлов..."
+                log "Очищаем папку $cat_dir от временных файлов..."
                 
                 # Сохраняем файлы, созданные take_all.py (JSON файлы с processed_ в имени)
                 # Удаляем json_data директорию и её содержимое
-                if [ -d "$dir/json_data" ]; then
-                    rm -rf "$dir/json_data"
-                    log "Удалена директория json_data из $dir"
+                if [ -d "$cat_dir/json_data" ]; then
+                    rm -rf "$cat_dir/json_data"
+                    log "Удалена директория json_data из $cat_dir"
                 fi
                 
                 # Удаляем другие временные файлы, но сохраняем важные результаты
-                find "$dir" -name "*.json" ! -name "processed_*" ! -name "properties.json" -delete 2>/dev/null || true
+                find "$cat_dir" -name "*.json" ! -name "processed_*" ! -name "properties.json" -delete 2>/dev/null || true
                 
-                log "Очистка папки $dir завершена"
+                log "Очистка папки $cat_dir завершена"
             else
-                log_error "Ошибка при выполнении take_all.py для $dir"
+                log_error "Ошибка при выполнении take_all.py для $cat_dir"
             fi
         else
             log_error "Файл take_all.py не найден!"
         fi
     fi
+    done
 done
 
 # 8. Импорт в Django (если есть property_analyzer)
@@ -187,7 +180,7 @@ echo -e "${YELLOW}Результаты сохранены в:${NC}"
 for dir in $CREATED_DIRS; do
     if [ -d "$dir" ]; then
         echo -e "  📁 $dir"
-        ls -la "$dir"/*.json 2>/dev/null | sed 's/^/    /' || echo "    (нет JSON файлов)"
+        ls -la "$dir"/*_listings/*.json 2>/dev/null | sed 's/^/    /' || echo "    (нет JSON файлов)"
     fi
 done
 
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Compact persisted set of listing ids and URLs.
+
+A :class:`SeenSet` keeps every key as a 64-bit integer (the listing id, or
+a hash of a URL / id that is not numeric) in two files::
+
+    <path>.ids      sorted uint64 keys, the exact set (memory-mapped)
+    <path>.bloom    Bloom filter over the same keys
+
+A lookup asks the Bloom filter first; only its positives (true ones plus
+about ``error_rate`` of the misses) binary-search the id file, so the
+answer is exact while memory stays at the filter size (~1.2 bytes per key
+at 1%) plus the keys added since the last :meth:`SeenSet.flush`.  New keys
+are merged into the id file in chunks under a file lock, so rent and sale
+crawlers may share one set, each seeing the other's keys after a flush.
+
+``SeenSet()`` without a path is a temporary set for the dedup of one run.
+"""
+
+import array
+import hashlib
+import math
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from listing_index import listing_id_from_url
+
+DEFAULT_CAPACITY = 1000000
+DEFAULT_ERROR_RATE = 0.01
+FLUSH_EVERY = 100000
+# Ключи-хэши (URL, нечисловые id) отличаются от числовых id старшим битом
+HASH_FLAG = 1 << 63
+BLOOM_MAGIC = b"PFBLOOM1"
+BLOOM_HEADER = struct.Struct("<8sQQQd")
+MERGE_CHUNK = 1 << 20
+
+
+def seen_key(value):
+    """64-bit key of a listing id or URL: the numeric id itself, else a hash."""
+    value = str(value)
+    listing_id = value if value.isdigit() else listing_id_from_url(value)
+    if listing_id and int(listing_id) < HASH_FLAG:
+        return int(listing_id)
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") | HASH_FLAG
+
+
+class BloomFilter:
+    """Bloom filter over 64-bit integer keys (double hashing of blake2b)."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE, bits=None, hashes=None):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.m = bits or max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = hashes or max(1, round(self.m / self.capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.to_bytes(8, "little"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self, key):
+        """Set the bits of ``key``; returns True if they were all set already."""
+        bits = self.bits
+        present = True
+        for pos in self._positions(key):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        return present
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def save(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(BLOOM_HEADER.pack(BLOOM_MAGIC, self.m, self.k, self.capacity, self.error_rate))
+            f.write(self.bits)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            magic, m, k, capacity, error_rate = BLOOM_HEADER.unpack(f.read(BLOOM_HEADER.size))
+            if magic != BLOOM_MAGIC:
+                raise ValueError(f"{path}: not a Bloom filter file")
+            bloom = cls(capacity, error_rate, bits=m, hashes=k)
+            f.readinto(bloom.bits)
+        return bloom
+
+
+class SeenSet:
+    """Exact set of listing ids / URLs: Bloom filter in front of a sorted id file."""
+
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE,
+                 flush_every=FLUSH_EVERY):
+        self.temporary = path is None
+        if self.temporary:
+            self._tmpdir = tempfile.mkdtemp(prefix="seen_")
+            path = os.path.join(self._tmpdir, "seen")
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ids_path = path + ".ids"
+        self.bloom_path = path + ".bloom"
+        self.error_rate = error_rate
+        self.flush_every = flush_every
+        self.pending = set()
+        self._file = self._map = None
+        self._count = 0
+        with self._locked():
+            if not os.path.exists(self.ids_path):
+                open(self.ids_path, "wb").close()
+            self._open_ids()
+            self.bloom = None
+            self._stamp = self._bloom_stamp()
+            if self._stamp is not None:
+                self.bloom = BloomFilter.load(self.bloom_path)
+            if self.bloom is None or self.bloom.capacity < self._count:
+                self._rebuild_bloom(max(capacity, 2 * self._count))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count + len(self.pending)
+
+    def __contains__(self, value):
+        key = seen_key(value)
+        if key not in self.bloom:
+            return False
+        return key in self.pending or self._in_file(key)
+
+    def add(self, value):
+        """Add a listing id or URL; returns False if it was already in the set."""
+        key = seen_key(value)
+        if self.bloom.add(key) and (key in self.pending or self._in_file(key)):
+            return False
+        self.pending.add(key)
+        if len(self.pending) >= max(self.flush_every, self._count // 16):
+            self.flush()
+        return True
+
+    def flush(self):
+        """Merge the keys added since the last flush into the files."""
+        if not self.pending:
+            return
+        with self._locked():
+            new = sorted(self.pending)
+            self._close_ids()
+            self._merge(new)
+            self._open_ids()
+            if not self.temporary and self._bloom_stamp() != self._stamp:
+                # Фильтр изменён другим процессом: взять его ключи
+                self.bloom = BloomFilter.load(self.bloom_path)
+                for key in new:
+                    self.bloom.add(key)
+            self.pending.clear()
+            if self.bloom.capacity < self._count:
+                self._rebuild_bloom(2 * self._count)
+            elif not self.temporary:
+                self._save_bloom()
+
+    def close(self):
+        self.flush()
+        self._close_ids()
+        if self.temporary:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    # --- id file ---
+
+    def _locked(self):
+        return _FileLock(None if self.temporary else self.path + ".lock")
+
+    def _open_ids(self):
+        self._count = os.path.getsize(self.ids_path) // 8
+        if self._count:
+            self._file = open(self.ids_path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _close_ids(self):
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        self._file = self._map = None
+
+    def _in_file(self, key):
+        lo, hi = 0, self._count
+        mm = self._map
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = struct.unpack_from("<Q", mm, mid * 8)[0]
+            if value < key:
+                lo = mid + 1
+            elif value > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def _merge(self, new):
+        """Merge sorted ``new`` keys into the id file, one chunk of the file at a time."""
+        tmp = self.ids_path + ".tmp"
+        j = 0
+        with open(self.ids_path, "rb") as src, open(tmp, "wb") as dst:
+            while True:
+                chunk = _read_keys(src, MERGE_CHUNK)
+                if not chunk:
+                    break
+                end = j
+                if len(chunk) == MERGE_CHUNK:
+                    top = chunk[-1]
+                    while end < len(new) and new[end] <= top:
+                        end += 1
+                else:
+                    end = len(new)
+                if end > j:
+                    chunk = array.array("Q", sorted(set(chunk).union(new[j:end])))
+                    j = end
+                _write_keys(dst, chunk)
+            if j < len(new):
+                _write_keys(dst, array.array("Q", new[j:]))
+        os.replace(tmp, self.ids_path)
+
+    def _rebuild_bloom(self, capacity):
+        self.bloom = BloomFilter(capacity, self.error_rate)
+        with open(self.ids_path, "rb") as f:
+            while True:
+                chunk = _read_keys(f, MERGE_CHUNK)
+                if not chunk:
+                    break
+                for key in chunk:
+                    self.bloom.add(key)
+        for key in self.pending:
+            self.bloom.add(key)
+        if not self.temporary:
+            self._save_bloom()
+
+    def _bloom_stamp(self):
+        try:
+            st = os.stat(self.bloom_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _save_bloom(self):
+        self.bloom.save(self.bloom_path)
+        self._stamp = self._bloom_stamp()
+
+
+def _read_keys(f, n):
+    keys = array.array("Q")
+    data = f.read(n * 8)
+    keys.frombytes(data[:len(data) // 8 * 8])
+    if sys.byteorder != "little":
+        keys.byteswap()
+    return keys
+
+
+def _write_keys(f, keys):
+    if sys.byteorder != "little":
+        keys = array.array("Q", keys)
+        keys.byteswap()
+    keys.tofile(f)
+
+
+class _FileLock:
+    """Exclusive flock on ``path`` (no-op for None or without fcntl)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+
+    def __enter__(self):
+        if self.path is not None and fcntl is not None:
+            self.f = open(self.path, "a")
+            fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.f is not None:
+            fcntl.flock(self.f, fcntl.LOCK_UN)
+            self.f.close()
+            self.f = None
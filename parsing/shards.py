@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Sharded compressed NDJSON storage for raw scraped listings.
+
+Instead of one small .json file per listing, ``a.py --storage shards``
+appends each raw listing as one line to a rotating shard::
+
+    json_data/shard-<host>-<pid>-0000.ndjson.gz
+    json_data/shard-<host>-<pid>-0000.ndjson.gz.idx    id <TAB> offset <TAB> length
+
+Every record is written as its own gzip member (zstd frame), so a shard is
+a valid .gz (.zst) file that streams line by line, and the ``.idx`` sidecar
+locates each record: ``length`` compressed bytes at ``offset``.
+Each writing process owns its shards, so parse workers (and a.py
+--worker processes on other hosts sharing the directory) never share a file.
+
+Readers (take_all.py, a.process_directory, import_properties) use
+:func:`is_shard` and :func:`iter_shard_records`.  Only the standard library
+is required; zstd needs the optional ``zstandard`` package.
+
+The same format serves the NDJSON output of the transform stage
+(``properties.ndjson[.gz|.zst]``, :class:`NdjsonWriter`): records are
+compressed in members of ``OUTPUT_MEMBER_SIZE`` bytes, so
+:func:`iter_ndjson_records` streams them with bounded memory.
+:func:`iter_json_array` streams the JSON array output (properties.json)
+the same way.
+"""
+
+import gzip
+import json
+import os
+import re
+import socket
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SHARD_SUFFIXES = {
+    "gzip": ".ndjson.gz",
+    "zstd": ".ndjson.zst",
+}
+INDEX_SUFFIX = ".idx"
+NDJSON_SUFFIX = ".ndjson"
+DEFAULT_SHARD_SIZE = 256 * 1024 * 1024
+# Размер несжатого блока (gzip member / zstd frame) в выходном NDJSON
+OUTPUT_MEMBER_SIZE = 1024 * 1024
+HOST = re.sub(r"\W+", "_", socket.gethostname())
+# Имя шарда ShardWriter (без <host>- в шардах ранних версий); properties.ndjson.gz
+# и cards.ndjson шардами не считаются
+SHARD_NAME_RE = re.compile(r"shard-(?:\w+-)?\d+-\d{4,}\.ndjson\.(?:gz|zst)")
+
+
+def is_shard(path):
+    """Raw listing shard written by :class:`ShardWriter` (by its file name)."""
+    return SHARD_NAME_RE.fullmatch(os.path.basename(path)) is not None
+
+
+def is_compressed_ndjson(path):
+    """Gzip / zstd NDJSON: a shard or a compressed transform output."""
+    return any(path.endswith(suffix) for suffix in SHARD_SUFFIXES.values())
+
+
+def is_ndjson(path):
+    """NDJSON file, plain or compressed (shards and transform output)."""
+    return path.endswith(NDJSON_SUFFIX) or is_compressed_ndjson(path)
+
+
+def _compression_of(path):
+    return "zstd" if path.endswith(SHARD_SUFFIXES["zstd"]) else "gzip"
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("zstd shards need the 'zstandard' package (pip install zstandard)")
+
+
+def compact_line(raw):
+    """One NDJSON line (bytes, with newline) for a raw JSON document (str or bytes)."""
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    raw = raw.strip()
+    if b"\n" in raw or b"\r" in raw:
+        raw = json.dumps(json.loads(raw), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return raw + b"\n"
+
+
+class ShardWriter:
+    """Appends records to rotating shards in ``directory`` for this process."""
+
+    def __init__(self, directory, compression="gzip", max_bytes=DEFAULT_SHARD_SIZE):
+        if compression == "zstd":
+            _require_zstd()
+            self._zstd = zstandard.ZstdCompressor(level=3)
+        elif compression != "gzip":
+            raise ValueError(f"unknown shard compression: {compression}")
+        self.directory = directory
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.seq = 0
+        self.data = None
+        self.index = None
+        self.lock = threading.Lock()
+
+    def _compress(self, line):
+        if self.compression == "zstd":
+            return self._zstd.compress(line)
+        return gzip.compress(line, compresslevel=6, mtime=0)
+
+    def _open(self):
+        while True:
+            name = f"shard-{HOST}-{os.getpid()}-{self.seq:04d}{SHARD_SUFFIXES[self.compression]}"
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path) or os.path.getsize(path) < self.max_bytes:
+                break
+            self.seq += 1
+        self.data = open(path, "ab")
+        self.index = open(path + INDEX_SUFFIX, "a", encoding="utf-8")
+
+    def append(self, listing_id, raw):
+        """Append one raw listing; returns (shard path, offset, length)."""
+        member = self._compress(compact_line(raw))
+        with self.lock:
+            if self.data is None:
+                self._open()
+            elif self.data.tell() >= self.max_bytes:
+                self.close()
+                self.seq += 1
+                self._open()
+            offset = self.data.tell()
+            self.data.write(member)
+            self.data.flush()
+            self.index.write(f"{listing_id}\t{offset}\t{len(member)}\n")
+            self.index.flush()
+            return self.data.name, offset, len(member)
+
+    def close(self):
+        for f in (self.data, self.index):
+            if f is not None:
+                f.close()
+        self.data = self.index = None
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def append_record(directory, listing_id, raw, compression="gzip", max_bytes=DEFAULT_SHARD_SIZE):
+    """Append through a per-process writer (safe to call from pool workers)."""
+    key = (os.getpid(), directory, compression)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = ShardWriter(directory, compression, max_bytes)
+    return writer.append(listing_id, raw)
+
+
+class NdjsonWriter:
+    """Writes NDJSON lines to ``path``: plain for .ndjson, else gzip / zstd by suffix.
+
+    Compressed output is cut into members of ``member_size`` uncompressed
+    bytes; the result is a regular .gz / .zst file.  ``append`` adds lines
+    (new members) to an existing file.
+    """
+
+    def __init__(self, path, member_size=OUTPUT_MEMBER_SIZE, append=False):
+        if path.endswith(NDJSON_SUFFIX):
+            self.compression = None
+        elif is_compressed_ndjson(path):
+            self.compression = _compression_of(path)
+        else:
+            raise ValueError(f"{path}: expected .ndjson, .ndjson.gz or .ndjson.zst")
+        if self.compression == "zstd":
+            _require_zstd()
+            self._zstd = zstandard.ZstdCompressor(level=3)
+        self.member_size = member_size
+        self.f = open(path, "ab" if append else "wb")
+        self.pending = []
+        self.pending_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, line):
+        """Append one line (bytes ending with a newline)."""
+        if self.compression is None:
+            self.f.write(line)
+            return
+        self.pending.append(line)
+        self.pending_bytes += len(line)
+        if self.pending_bytes >= self.member_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        data = b"".join(self.pending)
+        if self.compression == "zstd":
+            self.f.write(self._zstd.compress(data))
+        else:
+            self.f.write(gzip.compress(data, compresslevel=6, mtime=0))
+        self.pending = []
+        self.pending_bytes = 0
+
+    def close(self):
+        if self.f is not None:
+            self._flush()
+            self.f.close()
+            self.f = None
+
+
+def _gzip_chunks(raw, chunk_size=1 << 20):
+    """Decompressed data of concatenated gzip members, one member at a time.
+
+    Only complete members are yielded, so a record truncated by a crash at
+    the end of the shard is dropped without losing the ones before it.
+    """
+    decomp = zlib.decompressobj(wbits=31)
+    pending = []
+    data = raw.read(chunk_size)
+    while data:
+        pending.append(decomp.decompress(data))
+        if decomp.eof:
+            yield b"".join(pending)
+            pending = []
+            data = decomp.unused_data
+            decomp = zlib.decompressobj(wbits=31)
+            if not data:
+                data = raw.read(chunk_size)
+        else:
+            data = raw.read(chunk_size)
+
+
+def _zstd_chunks(raw, chunk_size=1 << 20):
+    _require_zstd()
+    reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+    try:
+        while True:
+            data = reader.read(chunk_size)
+            if not data:
+                return
+            yield data
+    except zstandard.ZstdError:
+        return
+
+
+def iter_shard_lines(path):
+    """Yield the raw NDJSON lines (bytes) of a shard or another compressed NDJSON file.
+
+    A record truncated by a crash at the end of the shard is skipped.
+    """
+    with open(path, "rb") as raw:
+        chunks = _zstd_chunks(raw) if _compression_of(path) == "zstd" else _gzip_chunks(raw)
+        tail = b""
+        try:
+            for chunk in chunks:
+                lines = (tail + chunk).split(b"\n")
+                tail = lines.pop()
+                for line in lines:
+                    yield line + b"\n"
+        except zlib.error:
+            return
+
+
+def iter_shard_records(path):
+    """Yield the parsed records (dicts) of a shard in write order."""
+    for line in iter_shard_lines(path):
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_ndjson_records(path):
+    """Yield the records of a plain or compressed NDJSON file."""
+    if is_compressed_ndjson(path):
+        yield from iter_shard_records(path)
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def iter_json_array(path, chunk_size=1 << 20, with_text=False):
+    """Yield the elements of a top-level JSON array without loading the whole file.
+
+    ``with_text`` yields (element, its source text) pairs.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        pos = _skip(buf, 0, " \t\r\n")
+        if buf[pos:pos + 1] != "[":
+            raise ValueError(f"{path}: not a JSON array")
+        pos += 1
+        eof = False
+        while True:
+            pos = _skip(buf, pos, " \t\r\n,")
+            if buf[pos:pos + 1] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield (item, buf[pos:end]) if with_text else item
+            pos = end
+
+
+def _skip(buf, pos, chars):
+    while pos < len(buf) and buf[pos] in chars:
+        pos += 1
+    return pos
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Diff of two scrape snapshots: new, removed and price-changed listings.
+
+Each snapshot (a ``scrape_<ts>`` directory of a.py, a category directory,
+or a single properties.json / NDJSON file) is reduced to (id, price,
+category, url) rows, sorted by id and merge-joined with the other one::
+
+    python snapshot_diff.py scraped_data/scrape_20241212_143022 \\
+        scraped_data/scrape_20241213_143022 --output changes.ndjson
+
+Every difference is one NDJSON line::
+
+    {"change": "new", "id": "123", "category": "rent", "price": 95000.0, "url": "..."}
+    {"change": "removed", "id": "456", ...}
+    {"change": "price", "id": "789", ..., "old_price": 120000.0, "price": 110000.0}
+
+Memory does not depend on the snapshot size: rows are sorted in runs of
+``RUN_SIZE`` spilled to temporary files and merged with :func:`heapq.merge`;
+a snapshot that fits in one run is never written to disk.  Within a
+snapshot the first row of an id wins (property pages before search cards,
+as in a.process_directory).  Property pages are not parsed: their id,
+price and URL are read with :func:`extract.property_key`.
+
+Only full snapshots are comparable.  A run of ``a.py --incremental`` or
+``--skip-seen`` saves just the listings it fetched, and every other one
+would show up as removed, so such snapshots (recognised by the run
+parameters in their journal.sqlite) are refused.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from itertools import groupby
+from operator import itemgetter
+
+from extract import property_key
+from journal import JOURNAL_FILE
+from listing_index import listing_id_from_url, normalize_price
+from shards import is_ndjson, is_shard, iter_json_array, iter_ndjson_records, iter_shard_lines
+
+# Строк в одном отсортированном прогоне (~100 МБ памяти)
+RUN_SIZE = 500000
+# Карточки поиска режима --cards-only (a.CARDS_FILE)
+CARDS_FILE = "cards.ndjson"
+LISTINGS_SUFFIX = "_listings"
+# Итоговый файл a.py: properties.json или properties.ndjson[.gz|.zst] (--output-format)
+TRANSFORMED_FILES = ("properties.json", "properties.ndjson", "properties.ndjson.gz",
+                     "properties.ndjson.zst")
+# Параметры запуска a.py, при которых снимок содержит не все объявления
+PARTIAL_RUN_FLAGS = {"incremental": "--incremental", "skip_seen": "--skip-seen"}
+
+
+def record_key(data, category=None):
+    """(id, price, category, url) of a raw property page or a transformed record, or None."""
+    prop = data.get("props", {}).get("pageProps", {}).get("propertyResult", {}).get("property")
+    if prop:
+        url = prop.get("share_url")
+        price = (prop.get("price") or {}).get("value")
+    else:
+        url = data.get("url") or data.get("share_url")
+        price = data.get("price")
+        if isinstance(price, dict):
+            price = price.get("value")
+        prop = data
+        category = category or _category_of_duration(data.get("priceDuration"))
+    listing_id = prop.get("id") or (listing_id_from_url(url) if url else None)
+    if listing_id is None:
+        return None
+    return str(listing_id), normalize_price(price), category, url
+
+
+def page_row(raw, category=None):
+    """record_key of one JSON document (bytes); property pages are read with extract.property_key."""
+    key = property_key(raw)
+    if key is not None:
+        listing_id, url, price = key
+        return listing_id, normalize_price(price), category, url
+    data = json.loads(raw)
+    return record_key(data, category) if isinstance(data, dict) else None
+
+
+def _category_of_duration(duration):
+    return {"rent": "rent", "sell": "sale"}.get(duration)
+
+
+def iter_file(path, category=None):
+    """Rows of one file: raw page, shard, NDJSON (cards) or JSON array (properties.json)."""
+    if is_shard(path):
+        for line in iter_shard_lines(path):
+            row = page_row(line, category) if line.strip() else None
+            if row is not None:
+                yield row
+        return
+    if is_ndjson(path):
+        records = iter_ndjson_records(path)
+    else:
+        with open(path, "rb") as f:
+            head = f.read(64).lstrip()
+            if not head.startswith(b"["):
+                row = page_row(head + f.read(), category)
+                if row is not None:
+                    yield row
+                return
+        records = iter_json_array(path)
+    for data in records:
+        if isinstance(data, dict):
+            row = record_key(data, category)
+            if row is not None:
+                yield row
+
+
+def iter_snapshot(path, source="raw"):
+    """Rows of a snapshot.
+
+    ``source`` "raw" reads the property pages (json_data files and shards)
+    and then cards.ndjson of every ``<category>_listings`` directory;
+    "transformed" reads their properties.json / properties.ndjson[.gz|.zst]
+    instead (faster, but only as complete as the transform).
+    """
+    if os.path.isfile(path):
+        yield from iter_file(path)
+        return
+    category_dirs = sorted(
+        os.path.join(dirpath, name)
+        for dirpath, dirnames, _ in os.walk(path)
+        for name in dirnames
+        if name.endswith(LISTINGS_SUFFIX)
+    )
+    if not category_dirs and os.path.basename(os.path.normpath(path)).endswith(LISTINGS_SUFFIX):
+        category_dirs = [path]
+    if not category_dirs:
+        category_dirs = [path]
+    for cat_dir in category_dirs:
+        name = os.path.basename(os.path.normpath(cat_dir))
+        category = name[:-len(LISTINGS_SUFFIX)] if name.endswith(LISTINGS_SUFFIX) else None
+        if source == "transformed":
+            for name in TRANSFORMED_FILES:
+                transformed = os.path.join(cat_dir, name)
+                if os.path.exists(transformed):
+                    yield from iter_file(transformed, category)
+                    break
+            continue
+        for dirpath, dirnames, files in os.walk(cat_dir):
+            dirnames.sort()
+            for fn in sorted(files):
+                if fn in TRANSFORMED_FILES or fn == CARDS_FILE or fn.startswith("processed_"):
+                    continue
+                if is_ndjson(fn) or fn.endswith(".json"):
+                    file_path = os.path.join(dirpath, fn)
+                    try:
+                        yield from iter_file(file_path, category)
+                    except Exception as e:
+                        print(f"Error reading {file_path}: {e}", file=sys.stderr)
+        cards = os.path.join(cat_dir, CARDS_FILE)
+        if os.path.exists(cards):
+            yield from iter_file(cards, category)
+
+
+def snapshot_run(path):
+    """Run parameters journaled by a.py for the snapshot at ``path`` (journal.py), or None.
+
+    The journal is looked up in ``path`` and up to two parent directories,
+    so a category directory or its properties.json finds its scrape_<ts>.
+    """
+    directory = os.path.abspath(path if os.path.isdir(path) else os.path.dirname(path))
+    for _ in range(3):
+        journal_path = os.path.join(directory, JOURNAL_FILE)
+        if os.path.isfile(journal_path):
+            conn = sqlite3.connect(f"file:{journal_path}?mode=ro", uri=True)
+            try:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'run'").fetchone()
+            finally:
+                conn.close()
+            return json.loads(row[0]) if row else None
+        directory = os.path.dirname(directory)
+    return None
+
+
+def check_full_snapshot(path):
+    """Raise ValueError if a.py wrote the snapshot in a mode that saves only some listings."""
+    run = snapshot_run(path) or {}
+    flags = [flag for key, flag in PARTIAL_RUN_FLAGS.items() if run.get(key)]
+    if flags:
+        raise ValueError(f"{path} was scraped with {' '.join(flags)} and holds only the listings "
+                         f"fetched by that run; the diff would report all others as removed")
+
+
+def sorted_rows(rows, tmpdir, run_size=RUN_SIZE):
+    """``rows`` sorted by id, first row of each id only (external merge sort)."""
+    runs = []
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= run_size:
+            runs.append(_write_run(chunk, tmpdir))
+            chunk = []
+    chunk.sort(key=itemgetter(0))
+    if runs:
+        if chunk:
+            runs.append(_write_run(chunk, tmpdir))
+        merged = heapq.merge(*(_read_run(run) for run in runs), key=itemgetter(0))
+    else:
+        merged = iter(chunk)
+    for _, group in groupby(merged, key=itemgetter(0)):
+        yield next(group)
+
+
+def _write_run(chunk, tmpdir):
+    chunk.sort(key=itemgetter(0))
+    fd, path = tempfile.mkstemp(prefix="run_", suffix=".ndjson", dir=tmpdir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for row in chunk:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+    return path
+
+
+def _read_run(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield tuple(json.loads(line))
+
+
+def diff_rows(old, new):
+    """Merge-join two id-sorted row streams; yields change records."""
+    stats = {"old": 0, "new": 0, "added": 0, "removed": 0, "price": 0, "unchanged": 0}
+    old_row = next(old, None)
+    new_row = next(new, None)
+    while old_row is not None or new_row is not None:
+        if new_row is None or (old_row is not None and old_row[0] < new_row[0]):
+            stats["old"] += 1
+            stats["removed"] += 1
+            yield _change("removed", old_row), stats
+            old_row = next(old, None)
+        elif old_row is None or new_row[0] < old_row[0]:
+            stats["new"] += 1
+            stats["added"] += 1
+            yield _change("new", new_row), stats
+            new_row = next(new, None)
+        else:
+            stats["old"] += 1
+            stats["new"] += 1
+            old_price, price = old_row[1], new_row[1]
+            if old_price is not None and price is not None and old_price != price:
+                stats["price"] += 1
+                record = _change("price", new_row)
+                record["old_price"] = old_price
+                yield record, stats
+            else:
+                stats["unchanged"] += 1
+            old_row = next(old, None)
+            new_row = next(new, None)
+    yield None, stats
+
+
+def _change(kind, row):
+    listing_id, price, category, url = row
+    return {"change": kind, "id": listing_id, "category": category, "price": price, "url": url}
+
+
+def diff_snapshots(old_path, new_path, out, source="raw", run_size=RUN_SIZE):
+    """Write the NDJSON diff of two snapshots to ``out``; returns the counters.
+
+    Raises ValueError for a snapshot of an --incremental or --skip-seen run
+    (see :func:`check_full_snapshot`).
+    """
+    check_full_snapshot(old_path)
+    check_full_snapshot(new_path)
+    stats = {}
+    with tempfile.TemporaryDirectory(prefix="snapshot_diff_") as tmpdir:
+        old = sorted_rows(iter_snapshot(old_path, source), tmpdir, run_size)
+        new = sorted_rows(iter_snapshot(new_path, source), tmpdir, run_size)
+        for record, stats in diff_rows(old, new):
+            if record is not None:
+                out.write(json.dumps(record, ensure_ascii=False))
+                out.write("\n")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="New, removed and price-changed listings "
+                                                 "between two scrape snapshots (NDJSON)")
+    parser.add_argument("old", help="Earlier snapshot: scrape_<ts> directory or properties.json")
+    parser.add_argument("new", help="Later snapshot")
+    parser.add_argument("--output", default=None, help="NDJSON output file (default: stdout)")
+    parser.add_argument("--source", choices=("raw", "transformed"), default="raw",
+                        help="Read property pages + cards (raw, default) or properties.json "
+                             "(transformed) of the snapshot directories")
+    parser.add_argument("--run-size", type=int, default=RUN_SIZE,
+                        help=f"Rows sorted in memory before spilling to disk (default: {RUN_SIZE})")
+    args = parser.parse_args()
+
+    for path in (args.old, args.new):
+        if not os.path.exists(path):
+            parser.error(f"{path} does not exist")
+        try:
+            check_full_snapshot(path)
+        except ValueError as e:
+            parser.error(str(e))
+    start = time.perf_counter()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            stats = diff_snapshots(args.old, args.new, out, args.source, args.run_size)
+    else:
+        stats = diff_snapshots(args.old, args.new, sys.stdout, args.source, args.run_size)
+    print(f"{stats['old']} -> {stats['new']} listings: {stats['added']} new, "
+          f"{stats['removed']} removed, {stats['price']} price changed, "
+          f"{stats['unchanged']} unchanged ({time.perf_counter() - start:.1f}s)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Local stand-in for propertyfinder.ae, for benchmarks and regression runs.
+
+Serves responses recorded with ``a.py --record DIR`` (see replay.py).  A
+directory without a recording index is used as templates instead: its
+``search_*.html`` / ``detail_*.html`` pages are served for every search
+page up to ``--pages`` and every listing, with listing ids rewritten so
+that each page shows different listings (the bundled fixtures/ work as is).
+
+Latency, jitter and errors are injected per request::
+
+    python standin_server.py --port 8765 --latency 80 --jitter 40 \\
+        --error-429 0.02 --error-5xx 0.01 --timeouts 0.005
+    python a.py --base-url http://127.0.0.1:8765 --category sale
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import random
+import re
+
+from aiohttp import web
+
+from extract import extract_links_from_page, extract_next_data
+from listing_index import LISTING_ID_RE, listing_id_from_url
+from replay import fixture_key, load_fixtures, read_fixture
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+ORIGIN_RE = re.compile(rb"https?://(?:www\.)?propertyfinder\.ae")
+
+
+class RecordedSite:
+    """Recorded responses, looked up by fixture key."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.fixtures = load_fixtures(directory)
+
+    def __len__(self):
+        return len(self.fixtures)
+
+    def respond(self, request):
+        entry = self.fixtures.get(fixture_key(str(request.rel_url)))
+        if entry is None:
+            return 404, "text/html", b""
+        return entry["status"], entry["content_type"], read_fixture(self.directory, entry)
+
+
+class SyntheticSite:
+    """Search and detail templates replayed for any page and listing id."""
+
+    def __init__(self, directory, pages):
+        search = sorted(glob.glob(os.path.join(directory, "search_*.html")))
+        detail = sorted(glob.glob(os.path.join(directory, "detail_*.html")))
+        if not search or not detail:
+            raise SystemExit(f"{directory}: no {os.path.join(directory, 'index.jsonl')} "
+                             "and no search_*.html / detail_*.html templates")
+        with open(search[0], "rb") as f:
+            self.search = f.read()
+        with open(detail[0], "rb") as f:
+            self.detail = f.read()
+        self.pages = pages
+
+        ids = sorted({int(listing_id_from_url(link))
+                      for link in extract_links_from_page(self.search)
+                      if listing_id_from_url(link)})
+        self.per_page = len(ids)
+        self.span = ids[-1] - ids[0] + 1 if ids else 1
+        self.ids_re = re.compile(rb"\b(" + b"|".join(str(i).encode() for i in ids) + rb")\b")
+        total = pages * self.per_page
+        self.search = re.sub(rb'"page_count":\s*\d+', b'"page_count": %d' % pages, self.search)
+        self.search = re.sub(rb'"total_count":\s*\d+', b'"total_count": %d' % total, self.search)
+
+        prop = (extract_next_data(self.detail).get("props", {}).get("pageProps", {})
+                .get("propertyResult", {}).get("property", {}))
+        self.detail_id_re = re.compile(rb"\b%s\b" % str(prop.get("id")).encode())
+
+    def respond(self, request):
+        path = request.path
+        if path == "/en/search":
+            try:
+                page = int(request.query.get("page", "1"))
+                category = int(request.query.get("c", "1"))
+            except ValueError:
+                return 400, "text/html", b""
+            if not 1 <= page <= self.pages:
+                return 404, "text/html", b""
+            offset = (category * 100000 + page) * self.span
+            body = self.ids_re.sub(lambda m: str(int(m.group(1)) + offset).encode(), self.search)
+            return 200, "text/html", body
+        match = LISTING_ID_RE.search(path)
+        if path.startswith("/en/plp/") and match:
+            return 200, "text/html", self.detail_id_re.sub(match.group(1).encode(), self.detail)
+        return 404, "text/html", b""
+
+
+def make_app(site, latency=0.0, jitter=0.0, error_429=0.0, error_5xx=0.0,
+             timeouts=0.0, timeout_delay=60.0, seed=None):
+    """aiohttp application serving ``site`` with injected latency and errors.
+
+    ``latency`` / ``jitter`` are in seconds; the error arguments are the
+    probability of a 429, a 500/502, or a response held for ``timeout_delay``.
+    """
+    rng = random.Random(seed)
+
+    async def handle(request):
+        roll = rng.random()
+        delay = max(0.0, latency + rng.uniform(-jitter, jitter))
+        if roll < timeouts:
+            await asyncio.sleep(timeout_delay)
+            return web.Response(status=504)
+        await asyncio.sleep(delay)
+        roll -= timeouts
+        if roll < error_429:
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        roll -= error_429
+        if roll < error_5xx:
+            return web.Response(status=rng.choice((500, 502)))
+
+        status, content_type, body = site.respond(request)
+        origin = f"{request.scheme}://{request.host}".encode()
+        body = ORIGIN_RE.sub(origin, body)
+        return web.Response(status=status, body=body, content_type=content_type.split(";")[0])
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handle)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in server for a.py")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR,
+                        help="Recorded responses (a.py --record) or search_/detail_ templates "
+                             "(default: fixtures/)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=20,
+                        help="Search pages per category in template mode (default: 20)")
+    parser.add_argument("--latency", type=float, default=50.0,
+                        help="Mean response latency in ms (default: 50)")
+    parser.add_argument("--jitter", type=float, default=20.0,
+                        help="Latency jitter, +/- ms (default: 20)")
+    parser.add_argument("--error-429", type=float, default=0.0,
+                        help="Share of requests answered 429 with Retry-After (default: 0)")
+    parser.add_argument("--error-5xx", type=float, default=0.0,
+                        help="Share of requests answered 500/502 (default: 0)")
+    parser.add_argument("--timeouts", type=float, default=0.0,
+                        help="Share of requests held for --timeout-delay seconds (default: 0)")
+    parser.add_argument("--timeout-delay", type=float, default=60.0,
+                        help="How long a 'timed out' request is held, s (default: 60)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    args = parser.parse_args()
+
+    if load_fixtures(args.fixtures):
+        site = RecordedSite(args.fixtures)
+        print(f"Replaying {len(site)} recorded responses from {args.fixtures}")
+    else:
+        site = SyntheticSite(args.fixtures, args.pages)
+        print(f"Serving templates from {args.fixtures}: {args.pages} pages x "
+              f"{site.per_page} listings per category")
+    app = make_app(site, args.latency / 1000, args.jitter / 1000, args.error_429,
+                   args.error_5xx, args.timeouts, args.timeout_delay, args.seed)
+    print(f"Listening on http://{args.host}:{args.port}", flush=True)
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
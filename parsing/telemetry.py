@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Per-run crawl telemetry.
+
+:class:`CrawlTelemetry` counts requests by status, retries and downloaded
+bytes, and keeps histograms of the time spent fetching, parsing and
+writing.  At the end of a run a.py writes it as ``telemetry.json`` in the
+scrape directory and, with ``--metrics-file``, in the Prometheus text
+format (e.g. for node_exporter's textfile collector).
+"""
+
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+METRIC_PREFIX = "propertyfinder_crawl"
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.75,
+    1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 30.0, 60.0,
+)
+STAGES = ("fetch", "parse", "write")
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus ``le`` buckets plus +Inf)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate of the ``q`` quantile, interpolated within its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def cumulative(self):
+        """(le, cumulative count) pairs, ending with ("+Inf", count)."""
+        total = 0
+        pairs = []
+        for bound, n in zip(self.buckets + ("+Inf",), self.counts):
+            total += n
+            pairs.append((bound, total))
+        return pairs
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": _round(self.quantile(0.5)),
+            "p90": _round(self.quantile(0.9)),
+            "p99": _round(self.quantile(0.99)),
+            "buckets": {str(le): n for le, n in self.cumulative()},
+        }
+
+
+class CrawlTelemetry:
+    """Counters and stage histograms of one crawl."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.finished = None
+        self.requests = Counter()
+        self.retries = 0
+        self.bytes_downloaded = 0
+        self.cache = Counter()
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.counts = {}
+        self.info = {}
+
+    def request(self, status, latency=None, size=0):
+        """One HTTP attempt: ``status`` is the code or "timeout" / "network_error"."""
+        self.requests[str(status)] += 1
+        self.bytes_downloaded += size
+        if latency is not None:
+            self.stages["fetch"].observe(latency)
+
+    def retry(self):
+        self.retries += 1
+
+    def cache_event(self, kind, size=0):
+        """A response served by the HTTP cache: "hit" or "revalidated"."""
+        self.cache[kind] += 1
+        self.cache[f"{kind}_bytes"] += size
+
+    def count(self, kind, n=1):
+        """Count run items (search pages, links, saved properties, ...)."""
+        self.counts[kind] = self.counts.get(kind, 0) + n
+
+    def observe(self, stage, seconds):
+        if seconds is not None:
+            self.stages[stage].observe(seconds)
+
+    def latency_summary(self):
+        fetch = self.stages["fetch"]
+        if not fetch.count:
+            return "Fetch latency: no responses"
+        return (f"Fetch latency: p50 {fetch.quantile(0.5) * 1000:.1f} ms, "
+                f"p99 {fetch.quantile(0.99) * 1000:.1f} ms over {fetch.count} responses")
+
+    def finish(self):
+        self.finished = time.time()
+
+    def summary(self):
+        finished = self.finished or time.time()
+        duration = finished - self.started
+        counts = dict(self.counts)
+        return {
+            "started_at": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            "finished_at": datetime.fromtimestamp(finished, timezone.utc).isoformat(),
+            "duration_seconds": round(duration, 3),
+            "requests": dict(sorted(self.requests.items())),
+            "requests_total": sum(self.requests.values()),
+            "retries": self.retries,
+            "bytes_downloaded": self.bytes_downloaded,
+            "cache": dict(self.cache),
+            "counts": counts,
+            "rates": {
+                key + "_per_second": round(value / duration, 3) if duration > 0 else None
+                for key, value in counts.items()
+            },
+            "stage_seconds": {stage: round(h.sum, 3) for stage, h in self.stages.items()},
+            "histograms": {stage: h.to_dict() for stage, h in self.stages.items()},
+            "info": self.info,
+        }
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.summary(), ensure_ascii=False, indent=2) + "\n")
+
+    def prometheus_text(self):
+        p = METRIC_PREFIX
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{p}_{name}{labels} {value}")
+
+        metric("requests_total", "counter", "HTTP request attempts by status.",
+               [(f'{{status="{status}"}}', n) for status, n in sorted(self.requests.items())])
+        metric("retries_total", "counter", "Retried HTTP requests.", [("", self.retries)])
+        metric("downloaded_bytes_total", "counter", "Downloaded body bytes.",
+               [("", self.bytes_downloaded)])
+        metric("cache_responses_total", "counter", "Responses served by the HTTP cache.",
+               [(f'{{kind="{kind}"}}', n) for kind, n in sorted(self.cache.items())
+                if not kind.endswith("_bytes")])
+        metric("items_total", "counter", "Pages, links and properties of the run.",
+               [(f'{{kind="{kind}"}}', n) for kind, n in sorted(self.counts.items())])
+        metric("stage_seconds_total", "counter", "Busy time per stage, summed over requests.",
+               [(f'{{stage="{stage}"}}', round(h.sum, 6)) for stage, h in self.stages.items()])
+        for stage, h in self.stages.items():
+            name = f"{stage}_duration_seconds"
+            lines.append(f"# HELP {p}_{name} Time per {stage} operation.")
+            lines.append(f"# TYPE {p}_{name} histogram")
+            for le, n in h.cumulative():
+                lines.append(f'{p}_{name}_bucket{{le="{le}"}} {n}')
+            lines.append(f"{p}_{name}_sum {round(h.sum, 6)}")
+            lines.append(f"{p}_{name}_count {h.count}")
+        finished = self.finished or time.time()
+        metric("run_duration_seconds", "gauge", "Wall time of the run.",
+               [("", round(finished - self.started, 3))])
+        metric("run_finished_timestamp_seconds", "gauge", "End of the run (unix time).",
+               [("", round(finished, 3))])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        _write_atomic(path, self.prometheus_text())
+
+
+def _round(value):
+    return None if value is None else round(value, 6)
+
+
+def _write_atomic(path, text):
+    """Write via a temporary file so readers never see a partial file."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
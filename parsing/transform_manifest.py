@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Incremental transform output backed by a manifest of its input files.
+
+The state of an output of take_all.py / a.process_directory is kept in
+one hidden directory next to it, ``.<output name>.state/``.  Its manifest
+(``manifest.sqlite``) records every input file (path relative to the
+input directory, size, mtime, content hash) and the records it put in the
+output: their position (``offset``, ``records``) and how many were
+dropped as duplicates of an earlier id (``skipped``).  A rerun:
+
+* stats the inputs; only a file whose size or mtime changed is hashed,
+  and only a different hash makes it "changed";
+* transforms the new and changed files, nothing else (transform_pool.py);
+* appends their records when they all sort after the files already in
+  the output, checking ids against the output's id set ``seen.*`` in the
+  same directory (seen_set.py);
+* otherwise rewrites the output as a merge in path order: records of
+  unchanged files are copied from the old output (parsed only for their
+  id), the new ones are inserted at their place, and those of changed or
+  deleted files are dropped.
+
+Either way the output is the same as a full rebuild's.  When a changed or
+deleted file could have shadowed duplicates of later files, the files
+with skipped records are transformed again.  The manifest is trusted only
+while the output has the size and mtime it recorded and the transform's
+module is unchanged; otherwise (or with ``full``) the output is rebuilt.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+
+from seen_set import SeenSet
+from shards import is_ndjson
+from transform_pool import (RecordWriter, dumps, file_digest, input_files, iter_output,
+                            transform_paths)
+
+# Служебные файлы выхода: <каталог>/.<имя выхода>.state/{manifest.sqlite,seen.*}
+STATE_DIR = ".{}.state"
+MANIFEST_FILE = "manifest.sqlite"
+SEEN_NAME = "seen"
+# Так они лежали рядом с выходом раньше: <выход>.manifest.sqlite, <выход>.seen.*
+LEGACY_SUFFIXES = (".manifest.sqlite", ".seen.ids", ".seen.bloom", ".seen.lock")
+# Промежуточный файл перезаписи: <каталог>/.tmp-<имя выхода>
+TMP_PREFIX = ".tmp-"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    records INTEGER NOT NULL,
+    skipped INTEGER NOT NULL
+);
+"""
+
+
+class TransformManifest:
+    """Input files behind a transform output: path -> (size, mtime_ns, hash, offset, records, skipped)."""
+
+    def __init__(self, output_file):
+        directory = state_dir(output_file)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, MANIFEST_FILE)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def files(self):
+        return {
+            row[0]: row[1:] for row in
+            self.conn.execute("SELECT path, size, mtime_ns, hash, offset, records, skipped FROM files")
+        }
+
+    def save(self, entries, meta, replace=False):
+        """Store ``entries`` (path -> row) and ``meta`` in one transaction.
+
+        ``replace`` drops the entries that are not in ``entries``.
+        """
+        with self.conn:
+            if replace:
+                self.conn.execute("DELETE FROM files")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, offset, records, skipped) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((path,) + tuple(row) for path, row in entries.items()),
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                ((key, json.dumps(value)) for key, value in meta.items()),
+            )
+
+    def invalidate(self):
+        """Forget the output state, so that an interrupted update is followed by a full rebuild."""
+        with self.conn:
+            self.conn.execute("DELETE FROM meta WHERE key = 'output'")
+
+    def close(self):
+        self.conn.close()
+
+
+def state_dir(output_file):
+    """Hidden directory with the manifest and id set of ``output_file``."""
+    return os.path.join(os.path.dirname(output_file),
+                        STATE_DIR.format(os.path.basename(output_file)))
+
+
+def _remove_legacy_state(output_file):
+    for suffix in LEGACY_SUFFIXES:
+        if os.path.exists(output_file + suffix):
+            os.remove(output_file + suffix)
+
+
+def transform_version(transform):
+    """Name of ``transform`` and hash of its module's source: the output is stale if it changes."""
+    module = sys.modules.get(transform.__module__)
+    source = getattr(module, "__file__", None)
+    digest = file_digest(source) if source and os.path.isfile(source) else None
+    return f"{transform.__module__}.{transform.__qualname__}:{digest}"
+
+
+def _stat(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _relative(path, root_dir):
+    # input_files() строит пути как root_dir + os.sep + ...; relpath медленнее в разы
+    prefix = os.path.join(root_dir, "")
+    return path[len(prefix):] if path.startswith(prefix) else os.path.relpath(path, root_dir)
+
+
+def _reset_seen(seen_path):
+    for suffix in (".ids", ".bloom", ".lock"):
+        if os.path.exists(seen_path + suffix):
+            os.remove(seen_path + suffix)
+
+
+def _card_results(paths, compact):
+    """Results of already transformed NDJSON files (cards.ndjson), in the transform_paths shape."""
+    for path in paths:
+        records, errors, digest = [], [], None
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest = file_digest(data=raw)
+            for line in raw.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                    records.append((data.get("id"), dumps(data, compact)))
+                except Exception as e:
+                    errors.append(("record", str(e)))
+        except Exception as e:
+            errors.append(("file", str(e)))
+        yield path, records, errors, digest
+
+
+def build_output(root_dir, output_file, transform, ext=".json", workers=1, extra_files=(),
+                 full=False, on_error=None, on_duplicate=None):
+    """Bring ``output_file`` up to date with the files under ``root_dir``.
+
+    ``extra_files`` are NDJSON files of already transformed records
+    (cards.ndjson) that follow the input files.  The first record of an id
+    wins, in path order; ``on_error(path, kind, error)`` and
+    ``on_duplicate(path, id)`` report what is skipped.  Returns the
+    counters {"mode", "files", "transformed", "removed", "records"}, where
+    mode is "full", "rewrite", "append" or "unchanged".
+    """
+    tmp_file = os.path.join(os.path.dirname(output_file), TMP_PREFIX + os.path.basename(output_file))
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    seen_path = os.path.join(state_dir(output_file), SEEN_NAME)
+    _remove_legacy_state(output_file)
+    extra_files = [path for path in extra_files if os.path.exists(path)]
+    inputs = list(input_files(root_dir, ext, exclude=output_file)) + extra_files
+    rel = {path: _relative(path, root_dir) for path in inputs}
+    version = {"ext": ext, "transform": transform_version(transform)}
+
+    manifest = TransformManifest(output_file)
+    try:
+        meta = manifest.get_meta("output")
+        trusted = (not full and meta is not None and manifest.get_meta("version") == version
+                   and os.path.exists(output_file) and list(_stat(output_file)) == meta["stat"]
+                   and os.path.exists(seen_path + ".ids"))
+        old = manifest.files() if trusted else {}
+
+        # Неизменённые файлы (размер и mtime, иначе хэш) берутся из старого выхода
+        keep, restat, stats = {}, {}, {}
+        for path in inputs:
+            stats[path] = _stat(path)
+            entry = old.get(rel[path])
+            if entry is None:
+                continue
+            if tuple(entry[:2]) != stats[path]:
+                try:
+                    if file_digest(path) != entry[2]:
+                        continue
+                except OSError:
+                    continue
+                entry = stats[path] + tuple(entry[2:])
+                restat[rel[path]] = entry
+            keep[rel[path]] = entry
+        changed = [path for path in inputs if rel[path] in old and rel[path] not in keep]
+        removed = set(old) - set(rel.values())
+        if changed or removed:
+            # Записи, скрытые как дубликаты, могли стать первыми — такие файлы считаются заново
+            keep = {name: entry for name, entry in keep.items() if not entry[5]}
+            restat = {name: entry for name, entry in restat.items() if name in keep}
+        todo = [path for path in inputs if rel[path] not in keep]
+
+        counters = {"files": len(inputs), "transformed": len(todo), "removed": len(removed),
+                    "records": meta["records"] if trusted else 0}
+        if trusted and not todo and not removed:
+            if restat:
+                manifest.save(restat, {})
+            counters["mode"] = "unchanged"
+            return counters
+
+        positions = {path: i for i, path in enumerate(inputs)}
+        last_kept = max((positions[path] for path in inputs if rel[path] in keep), default=-1)
+        append = trusted and not removed and not changed and positions[todo[0]] > last_kept
+        # До конца записи манифест не доверяет выходу: прерванный запуск пересоберёт его
+        manifest.invalidate()
+        if not append:
+            _reset_seen(seen_path)
+
+        extra = set(extra_files)
+        compact = is_ndjson(output_file)
+        fresh = transform_paths([path for path in todo if path not in extra], transform,
+                                workers, compact)
+        fresh_extra = _card_results([path for path in todo if path in extra], compact)
+        entries = dict(restat)
+        count = counters["records"] if append else 0
+        old_records = iter_output(output_file) if keep and not append else iter(())
+        old_pos = 0
+
+        with SeenSet(seen_path) as seen, \
+                RecordWriter(output_file if append else tmp_file, append=append) as fout:
+
+            def write(path, oid, text):
+                nonlocal count
+                if oid and not seen.add(oid):
+                    if on_duplicate:
+                        on_duplicate(path, oid)
+                    return False
+                fout.write(text)
+                count += 1
+                return True
+
+            for path in (todo if append else inputs):
+                name = rel[path]
+                entry = keep.get(name)
+                start = count
+                if entry is not None:
+                    size, mtime_ns, digest, offset, records, skipped = entry
+                    for _ in range(offset - old_pos):
+                        next(old_records)
+                    for _ in range(records):
+                        oid, text = next(old_records)
+                        if not write(path, oid, text):
+                            skipped += 1
+                    old_pos = offset + records
+                    entries[name] = (size, mtime_ns, digest, start, count - start, skipped)
+                    continue
+                done, records, errors, digest = next(fresh_extra if path in extra else fresh)
+                assert done == path, (done, path)
+                for kind, error in errors:
+                    if on_error:
+                        on_error(path, kind, error)
+                skipped = sum(not write(path, oid, text) for oid, text in records)
+                if digest is not None:
+                    entries[name] = stats[path] + (digest, start, count - start, skipped)
+
+        if not append:
+            os.replace(tmp_file, output_file)
+        counters["records"] = count
+        counters["mode"] = "append" if append else "rewrite" if trusted else "full"
+        manifest.save(entries, {"version": version,
+                                "output": {"stat": list(_stat(output_file)), "records": count}},
+                      replace=not append)
+        return counters
+    finally:
+        manifest.close()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Parallel transform of raw listing files for take_all.py and a.process_directory.
+
+Input files are listed in sorted path order and cut into chunks
+(``CHUNK_FILES`` files, or one NDJSON shard); a process pool loads,
+transforms and serializes each chunk, and the caller's single writer gets
+the results back in input order.  Output and first-seen-wins dedup by id
+are therefore the same for any number of workers.  At most
+``CHUNKS_IN_FLIGHT`` chunks per worker are pending, so memory stays
+bounded on large inputs.  Workers also hash every file they read
+(:func:`file_digest`) for the transform manifest (transform_manifest.py).
+
+:class:`RecordWriter` is the output side: a JSON array, or one compact
+record per line when the output name ends with .ndjson, .ndjson.gz or
+.ndjson.zst; :func:`iter_output` reads such a file back.
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from shards import (NdjsonWriter, is_compressed_ndjson, is_ndjson, is_shard, iter_json_array,
+                    iter_shard_lines, iter_shard_records)
+
+# Файлов в одной задаче пула: достаточно, чтобы накладные расходы IPC были малы
+CHUNK_FILES = 64
+CHUNKS_IN_FLIGHT = 4
+# Блок чтения при хэшировании файла
+HASH_BLOCK = 1 << 20
+# "id" — первый ключ записи (field_map.FIELDS): его можно прочитать без разбора всей строки
+RECORD_ID = re.compile(r'\{\s*"id"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+|null)\s*[,}]')
+# Начало и конец JSON-массива, который пишет RecordWriter
+ARRAY_START = b"[\n"
+ARRAY_END = b"\n]\n"
+
+
+def input_files(root_dir, ext=".json", exclude=None):
+    """Files with ``ext`` and NDJSON shards under ``root_dir``, in sorted path order.
+
+    ``exclude`` (the output file, if it lies under ``root_dir``) is skipped.
+    """
+    exclude = os.path.abspath(exclude) if exclude else None
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if is_shard(filename) or filename.lower().endswith(ext):
+                path = os.path.join(dirpath, filename)
+                if os.path.abspath(path) != exclude:
+                    yield path
+
+
+def chunks(paths, size=CHUNK_FILES):
+    """Group paths into work units; every shard is a unit of its own."""
+    chunk = []
+    for path in paths:
+        if is_shard(path):
+            if chunk:
+                yield chunk
+                chunk = []
+            yield [path]
+            continue
+        chunk.append(path)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def file_digest(path=None, data=None):
+    """Content hash (blake2b, hex) of the file at ``path``, or of the bytes ``data``."""
+    h = hashlib.blake2b(digest_size=16)
+    if data is not None:
+        h.update(data)
+    else:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def dumps(obj, compact=False):
+    """Output text of a record: indented for a JSON array, one line for NDJSON."""
+    if compact:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+def transform_chunk(transform, paths, compact=False):
+    """Load and transform ``paths``: [(path, [(id, json text)], [error], digest)] in input order.
+
+    Runs in a pool worker; ``transform`` must be a module-level function.
+    ``digest`` is the :func:`file_digest` of the file, None if it could
+    not be read.
+    """
+    results = []
+    for path in paths:
+        records, errors, digest = [], [], None
+
+        def add(data):
+            obj = transform(data)
+            if obj is not None:
+                records.append((obj.get("id"), dumps(obj, compact)))
+
+        if is_shard(path):
+            try:
+                digest = file_digest(path)
+                for data in iter_shard_records(path):
+                    try:
+                        add(data)
+                    except Exception as e:
+                        errors.append(("record", str(e)))
+            except Exception as e:
+                errors.append(("shard", str(e)))
+        else:
+            try:
+                with open(path, "rb") as fin:
+                    raw = fin.read()
+                digest = file_digest(data=raw)
+                add(json.loads(raw))
+            except Exception as e:
+                errors.append(("file", str(e)))
+        results.append((path, records, errors, digest))
+    return results
+
+
+def transform_paths(paths, transform, workers=1, compact=False):
+    """Yield (path, [(id, json text)], [(kind, error)], digest) for every path, in order.
+
+    ``kind`` is "file", "shard" (the shard could not be read) or "record"
+    (one shard record failed).  ``workers`` > 1 fans chunks out to a
+    process pool; 1 transforms in this process.  ``compact`` gives one-line
+    texts (NDJSON).
+    """
+    work = chunks(paths)
+    if workers <= 1:
+        for paths in work:
+            yield from transform_chunk(transform, paths, compact)
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for paths in work:
+            pending.append(executor.submit(transform_chunk, transform, paths, compact))
+            if len(pending) >= workers * CHUNKS_IN_FLIGHT:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def iter_output(path):
+    """Yield (id, json text) of the records of a :class:`RecordWriter` output, in order."""
+    if is_compressed_ndjson(path):
+        yield from _output_lines(iter_shard_lines(path))
+        return
+    if is_ndjson(path):
+        with open(path, "rb") as f:
+            yield from _output_lines(f)
+        return
+    for obj, text in iter_json_array(path, with_text=True):
+        yield obj.get("id"), text
+
+
+def _output_lines(lines):
+    for line in lines:
+        text = line.rstrip(b"\r\n").decode("utf-8")
+        if text:
+            match = RECORD_ID.match(text)
+            oid = json.loads(match.group(1)) if match else json.loads(text).get("id")
+            yield oid, text
+
+
+class RecordWriter:
+    """Transform output: JSON array, or NDJSON (optionally gzip / zstd) by file name.
+
+    ``append`` adds records to an existing output instead of replacing it.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.compact = is_ndjson(path)
+        self.count = 0
+        if self.compact:
+            self.f = NdjsonWriter(path, append=append)
+        elif append:
+            # Снять закрывающую скобку массива и дописывать после последней записи
+            with open(path, "r+b") as f:
+                end = f.seek(0, os.SEEK_END) - len(ARRAY_END)
+                f.seek(max(end, 0))
+                if end < len(ARRAY_START) or f.read() != ARRAY_END:
+                    raise ValueError(f"{path}: not a RecordWriter JSON array")
+                f.truncate(end)
+            self.count = int(end > len(ARRAY_START))
+            self.f = open(path, "a", encoding="utf-8")
+        else:
+            self.f = open(path, "w", encoding="utf-8")
+            self.f.write(ARRAY_START.decode())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def dumps(self, obj):
+        return dumps(obj, self.compact)
+
+    def write(self, text):
+        """Append one record serialized with :meth:`dumps`."""
+        if self.compact:
+            self.f.write(text.encode("utf-8") + b"\n")
+        else:
+            if self.count:
+                self.f.write(",\n")
+            self.f.write(text)
+        self.count += 1
+
+    def close(self):
+        if self.f is None:
+            return
+        if not self.compact:
+            self.f.write(ARRAY_END.decode())
+        self.f.close()
+        self.f = None
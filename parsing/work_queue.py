@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Shared work table for a crawl spread over several machines.
+
+``a.py --coordinator WORK_DB`` creates the table and seeds it with the
+first search page of every category (or every partition root);
+``a.py --worker WORK_DB`` processes, on any number of hosts, claim items
+from it.  A search page item adds the remaining pages of its search (or the
+child slices of a partition) and one detail item per listing link; URLs
+are unique, so links found by several workers are fetched once.
+
+Claims are atomic (``BEGIN IMMEDIATE``) and leased for ``lease`` seconds.
+Workers extend their leases with heartbeats; items of a worker that stops
+heartbeating go back to ``pending`` once the lease expires and are claimed
+by another worker.  An item that was leased ``max_attempts`` times
+without finishing is marked failed.
+
+The table is an SQLite file on a volume all workers mount.  It runs in the
+rollback journal mode, since WAL needs shared memory that network file
+systems do not provide.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS work (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    category TEXT NOT NULL,
+    url TEXT NOT NULL UNIQUE,
+    payload TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cause TEXT,
+    status INTEGER,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS work_state ON work (state, kind, id);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    started_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Порядок выдачи: сначала объявления, потом страницы поиска, чтобы очередь ссылок не росла
+KINDS = ("detail", "search")
+DEFAULT_LEASE = 120.0
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+def worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """Work items (search pages and detail URLs) shared by coordinator and workers."""
+
+    def __init__(self, path, lease=DEFAULT_LEASE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        # Воркер вызывает методы из asyncio.to_thread, по одному за раз
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # --- run parameters ---
+
+    def set_meta(self, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value))
+        )
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    # --- items ---
+
+    def add(self, items):
+        """Add (kind, category, url, payload) items; known URLs are ignored."""
+        with _Transaction(self.conn):
+            return self._add(items)
+
+    def _add(self, items):
+        before = self.conn.total_changes
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO work (kind, category, url, payload, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(kind, category, url, json.dumps(payload), time.time())
+             for kind, category, url, payload in items],
+        )
+        return self.conn.total_changes - before
+
+    def claim(self, worker, limit):
+        """Lease up to ``limit`` items to ``worker``: [(id, kind, category, url, payload)].
+
+        Expired leases are released first; items leased ``max_attempts``
+        times are marked failed instead.
+        """
+        now = time.time()
+        rows = []
+        with _Transaction(self.conn):
+            self.conn.execute(
+                "UPDATE work SET state = 'failed', cause = 'abandoned', worker = NULL, "
+                "updated_at = ? WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            self.conn.execute(
+                "UPDATE work SET state = 'pending', worker = NULL, updated_at = ? "
+                "WHERE state = 'leased' AND lease_until < ?",
+                (now, now),
+            )
+            for kind in KINDS:
+                if len(rows) >= limit:
+                    break
+                rows += self.conn.execute(
+                    "SELECT id, kind, category, url, payload FROM work "
+                    "WHERE state = 'pending' AND kind = ? ORDER BY id LIMIT ?",
+                    (kind, limit - len(rows)),
+                ).fetchall()
+            self.conn.executemany(
+                "UPDATE work SET state = 'leased', worker = ?, lease_until = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(worker, now + self.lease, now, row[0]) for row in rows],
+            )
+        return [(id_, kind, category, url, json.loads(payload))
+                for id_, kind, category, url, payload in rows]
+
+    def report(self, worker, done=(), failed=(), retry=(), new_items=()):
+        """Record results of ``worker`` in one transaction.
+
+        ``done`` are item ids, ``failed`` / ``retry`` are (id, cause, status)
+        for items that failed for good / may be retried by any worker,
+        ``new_items`` are items discovered on the way (see :meth:`add`).
+        Only items still leased to ``worker`` are updated: once its lease
+        expired and another worker claimed the item, the result is dropped.
+        Returns the number of new items.
+        """
+        now = time.time()
+        with _Transaction(self.conn):
+            added = self._add(new_items)
+            n_done = self.conn.executemany(
+                "UPDATE work SET state = 'done', worker = NULL, cause = NULL, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'leased'",
+                [(now, id_, worker) for id_ in done],
+            ).rowcount
+            n_failed = self.conn.executemany(
+                "UPDATE work SET state = 'failed', worker = NULL, cause = ?, status = ?, "
+                "updated_at = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                [(cause, status, now, id_, worker) for id_, cause, status in failed],
+            ).rowcount
+            self.conn.executemany(
+                "UPDATE work SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, cause = ?, status = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND state = 'leased'",
+                [(self.max_attempts, cause, status, now, id_, worker)
+                 for id_, cause, status in retry],
+            )
+            self.conn.execute(
+                "UPDATE workers SET done = done + ?, failed = failed + ? WHERE id = ?",
+                (max(n_done, 0), max(n_failed, 0), worker),
+            )
+        return added
+
+    def heartbeat(self, worker):
+        """Extend the leases of ``worker`` and mark it alive."""
+        now = time.time()
+        with _Transaction(self.conn):
+            self.conn.execute(
+                "INSERT INTO workers (id, host, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (worker, socket.gethostname(), os.getpid(), now, now),
+            )
+            self.conn.execute(
+                "UPDATE work SET lease_until = ? WHERE worker = ? AND state = 'leased'",
+                (now + self.lease, worker),
+            )
+
+    def release(self, worker):
+        """Give back the items still leased to ``worker`` (on shutdown)."""
+        with _Transaction(self.conn):
+            self.conn.execute(
+                "UPDATE work SET state = 'pending', worker = NULL, attempts = attempts - 1, "
+                "updated_at = ? WHERE worker = ? AND state = 'leased'",
+                (time.time(), worker),
+            )
+
+    # --- progress ---
+
+    def counts(self):
+        """{kind: {state: n}}."""
+        counts = {kind: {} for kind in KINDS}
+        for kind, state, n in self.conn.execute(
+            "SELECT kind, state, COUNT(*) FROM work GROUP BY kind, state"
+        ):
+            counts.setdefault(kind, {})[state] = n
+        return counts
+
+    def is_finished(self):
+        row = self.conn.execute(
+            "SELECT 1 FROM work WHERE state IN ('pending', 'leased') LIMIT 1"
+        ).fetchone()
+        return row is None
+
+    def workers(self):
+        """[(id, seconds since last heartbeat, done, failed)]."""
+        now = time.time()
+        return [(id_, now - heartbeat_at, done, failed) for id_, heartbeat_at, done, failed in
+                self.conn.execute("SELECT id, heartbeat_at, done, failed FROM workers ORDER BY id")]
+
+    def failures(self):
+        return self.conn.execute(
+            "SELECT kind, category, url, cause, status, attempts FROM work "
+            "WHERE state = 'failed' ORDER BY id"
+        ).fetchall()
+
+
+class _Transaction:
+    """``BEGIN IMMEDIATE`` ... ``COMMIT`` (rolled back on error)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
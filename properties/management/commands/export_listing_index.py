@@ -0,0 +1,57 @@
+"""
+Команда для заполнения индекса объявлений парсера (a.py --incremental) из таблицы Property
+"""
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from properties.models import Property
+from parsing.listing_index import ListingIndex
+
+
+class Command(BaseCommand):
+    help = 'Заполняет индекс объявлений (id -> цена, время) для инкрементального парсинга'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'index_file',
+            nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'scraped_data', 'listing_index.sqlite'),
+            help='Путь к индексу (по умолчанию scraped_data/listing_index.sqlite)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Размер пакета записи (по умолчанию 5000)',
+        )
+
+    def handle(self, *args, **options):
+        index = ListingIndex(options['index_file'])
+        batch_size = options['batch_size']
+
+        queryset = Property.objects.values_list('property_id', 'price', 'url', 'updated_at', 'added_on')
+        total = 0
+        batch = []
+        try:
+            for property_id, price, url, updated_at, added_on in queryset.iterator(chunk_size=batch_size):
+                # import_rent_data добавляет префикс RENT_ к идентификатору
+                if property_id.startswith('RENT_'):
+                    property_id = property_id[len('RENT_'):]
+                seen = updated_at.timestamp() if updated_at else None
+                # Дата размещения нужна планировщику повторного обхода (recrawl.py)
+                listed = added_on.timestamp() if added_on else None
+                batch.append((property_id, price, url or None, seen, listed))
+                if len(batch) >= batch_size:
+                    index.record(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                index.record(batch)
+                total += len(batch)
+        finally:
+            index.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Записано {total} объявлений в {options["index_file"]}')
+        )
@@ -8,6 +8,10 @@ from django.db import transaction
 from django.db import transaction
 from django.utils.dateparse import parse_datetime
 from properties.models import Property, Building, AREAS_WITH_PROPERTY
+from parsing.shards import is_ndjson, is_shard, iter_ndjson_records
+
+# Сколько записей шарда / NDJSON импортировать за одну транзакцию
+SHARD_BATCH_SIZE = 500
 
 
 class Command(BaseCommand):
@@ -17,7 +21,7 @@ class Command(BaseCommand):
         parser.add_argument(
             'path',
             type=str,
-            help='Путь к JSON файлу или папке с JSON файлами'
+            help='Путь к JSON файлу, файлу NDJSON (.ndjson/.ndjson.gz/.ndjson.zst) или папке с ними'
         )
         parser.add_argument(
             '--clear',
@@ -49,7 +53,7 @@ class Command(BaseCommand):
 
         if os.path.isfile(path):
             # Импорт одного файла
-            self.import_json_file(path, update_existing)
+            self.import_file(path, update_existing)
         elif os.path.isdir(path):
             # Импорт всех JSON файлов в папке
             self.import_directory(path, update_existing)
@@ -62,10 +66,11 @@ class Command(BaseCommand):
         """Импорт всех JSON файлов из директории"""
         json_files = []
         
-        # Рекурсивный поиск JSON файлов
+        # Рекурсивный поиск JSON файлов и шардов; properties.ndjson* и cards.ndjson
+        # повторяют те же объявления — их можно импортировать, указав путь к файлу
         for root, dirs, files in os.walk(directory_path):
             for file in files:
-                if file.endswith('.json'):
+                if file.endswith('.json') or is_shard(file):
                     json_files.append(os.path.join(root, file))
         
         if not json_files:
@@ -84,7 +89,7 @@ class Command(BaseCommand):
         if batch_size == 1:
             for json_file in json_files:
                 try:
-                    self.import_json_file(json_file, update_existing)
+                    self.import_file(json_file, update_existing)
                 except Exception as e:
                     self.stdout.write(
                         self.style.ERROR(f'Ошибка при обработке {json_file}: {e}')
@@ -101,7 +106,7 @@ class Command(BaseCommand):
                 with transaction.atomic():
                     for json_file in group:
                         try:
-                            self.import_json_file(json_file, update_existing)
+                            self.import_file(json_file, update_existing)
                         except Exception as e:
                             self.stdout.write(
                                 self.style.ERROR(f'Ошибка при обработке {json_file}: {e}')
@@ -112,6 +117,41 @@ class Command(BaseCommand):
                 except Exception:
                     pass
 
+    def import_file(self, file_path, update_existing):
+        """Импорт JSON файла, шарда или файла NDJSON (properties.ndjson[.gz|.zst])"""
+        if is_ndjson(file_path):
+            self.import_shard_file(file_path, update_existing)
+        else:
+            self.import_json_file(file_path, update_existing)
+
+    def _infer_duration(self, file_path):
+        """Попытка вывести тип объявления из имени файла (rent/sell) как запасной вариант"""
+        inferred_duration = None
+        fn_lower = str(file_path).lower()
+        if 'for_rent' in fn_lower or '_rent_' in fn_lower or '/rent_' in fn_lower:
+            inferred_duration = 'rent'
+        elif 'for_sale' in fn_lower or '_sale_' in fn_lower or '/sale_' in fn_lower:
+            inferred_duration = 'sell'
+        self._inferred_duration = inferred_duration
+
+    def import_shard_file(self, file_path, update_existing):
+        """Потоковый импорт NDJSON (шард или вывод take_all / a.py): по SHARD_BATCH_SIZE записей"""
+        self.stdout.write(f'Обработка NDJSON: {file_path}')
+        self._infer_duration(file_path)
+        batch = []
+        try:
+            for data in iter_ndjson_records(file_path):
+                batch.extend(self._extract_properties_data(data) or [])
+                if len(batch) >= SHARD_BATCH_SIZE:
+                    self._bulk_import(batch, file_path, update_existing)
+                    batch = []
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Ошибка чтения NDJSON {file_path}: {e}')
+            )
+        if batch:
+            self._bulk_import(batch, file_path, update_existing)
+
     def import_json_file(self, file_path, update_existing):
         """Импорт данных из одного JSON файла"""
         self.stdout.write(f'Обработка файла: {file_path}')
@@ -125,15 +165,17 @@ class Command(BaseCommand):
             )
             return
 
-        # Определяем формат данных
-        # Попытка вывести тип объявления из имени файла (rent/sell) как запасной вариант
-        inferred_duration = None
-        fn_lower = str(file_path).lower()
-        if 'for_rent' in fn_lower or '_rent_' in fn_lower or '/rent_' in fn_lower:
-            inferred_duration = 'rent'
-        elif 'for_sale' in fn_lower or '_sale_' in fn_lower or '/sale_' in fn_lower:
-            inferred_duration = 'sell'
-        self._inferred_duration = inferred_duration
+        self._infer_duration(file_path)
+        properties_data = self._extract_properties_data(data)
+        if properties_data is None:
+            self.stdout.write(
+                self.style.WARNING(f'Неизвестный формат данных в {file_path}')
+            )
+            return
+        self._bulk_import(properties_data, file_path, update_existing)
+
+    def _extract_properties_data(self, data):
+        """Определяет формат данных и возвращает список объектов (None — неизвестный формат)"""
         if isinstance(data, list):
             # Массив объектов
             properties_data = data
@@ -180,12 +222,11 @@ class Command(BaseCommand):
             if properties_data is None:
                 properties_data = [data] if isinstance(data, dict) else []
         else:
-            self.stdout.write(
-                self.style.WARNING(f'Неизвестный формат данных в {file_path}')
-            )
-            return
+            return None
+        return properties_data
 
-        # Оптимизированный массовый импорт: bulk_create/bulk_update
+    def _bulk_import(self, properties_data, file_path, update_existing):
+        """Оптимизированный массовый импорт: bulk_create/bulk_update"""
         try:
             ids = []
             prepared = []
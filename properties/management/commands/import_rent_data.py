@@ -5,6 +5,8 @@ import json
 import os
 from decimal import Decimal
 from datetime import datetime
+from itertools import islice
+from parsing.shards import is_ndjson, iter_ndjson_records
 
 
 class Command(BaseCommand):
@@ -14,7 +16,7 @@ class Command(BaseCommand):
         parser.add_argument(
             'json_file',
             type=str,
-            help='Path to JSON file with rent data',
+            help='Path to JSON file with rent data (JSON array or .ndjson/.ndjson.gz/.ndjson.zst)',
         )
         parser.add_argument(
             '--batch-size',
@@ -41,27 +43,32 @@ class Command(BaseCommand):
         
         self.stdout.write(f'Loading data from {json_file}...')
         
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Error loading JSON: {e}')
-            )
-            return
-        
-        if not isinstance(data, list):
-            self.stdout.write(
-                self.style.ERROR('JSON should contain a list of properties')
-            )
-            return
-        
-        self.stdout.write(f'Found {len(data)} properties in JSON')
+        if is_ndjson(json_file):
+            # NDJSON (take_all.py / a.py --output-format ndjson): read line by line, memory stays flat
+            data = iter_ndjson_records(json_file)
+            self.stdout.write('Streaming NDJSON records')
+        else:
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                self.stdout.write(
+                    self.style.ERROR(f'Error loading JSON: {e}')
+                )
+                return
+            
+            if not isinstance(data, list):
+                self.stdout.write(
+                    self.style.ERROR('JSON should contain a list of properties')
+                )
+                return
+            
+            self.stdout.write(f'Found {len(data)} properties in JSON')
         
         if dry_run:
             self.stdout.write(self.style.WARNING('DRY RUN MODE - No data will be imported'))
             # Show first few records
-            for i, item in enumerate(data[:3]):
+            for i, item in enumerate(islice(data, 3)):
                 self.stdout.write(f'Sample {i+1}: {item.get("title", "No title")[:50]}...')
             return
         
@@ -69,9 +76,14 @@ class Command(BaseCommand):
         total_created = 0
         total_skipped = 0
         
-        for i in range(0, len(data), batch_size):
-            batch = data[i:i + batch_size]
-            self.stdout.write(f'Processing batch {i//batch_size + 1}: items {i+1}-{min(i+batch_size, len(data))}')
+        records = iter(data)
+        i = 0
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            self.stdout.write(f'Processing batch {i//batch_size + 1}: items {i+1}-{i+len(batch)}')
+            i += len(batch)
             
             properties_to_create = []
             
@@ -375,8 +375,9 @@ def _run_scrape_and_import():
             pass
 
     python_exec = sys.executable
-    run_cmd([python_exec, os.path.join(project_root, 'parsing', 'a_buy.py'), '--threads', '5', '--end-page', '2'])
-    run_cmd([python_exec, os.path.join(project_root, 'parsing', 'a.py'), '--threads', '5', '--end-page', '2'])
+    # Продажа и аренда в одном процессе: общий пул соединений и одна очередь запросов
+    run_cmd([python_exec, os.path.join(project_root, 'parsing', 'a.py'),
+             '--category', 'sale', '--category', 'rent', '--threads', '5', '--end-page', '2'])
     run_cmd([python_exec, os.path.join(project_root, 'manage.py'), 'import_properties', os.path.join(project_root, 'scraped_data'), '--update'])
 
 